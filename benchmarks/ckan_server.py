@@ -0,0 +1,227 @@
+"""Minimal stand-in for the CKAN endpoints ckan_data uses (package_show, datastore/dump and
+datastore_search), serving local CSV files so downloads can be measured and tested without the network.
+
+Run on its own, it serves the synthetic datasets (or fixture CSVs) for the dashboards to point at,
+optionally as slowly as a remote CKAN and publishing new outbreak rows every few seconds:
+
+    python -m benchmarks.ckan_server [--scale 1 | --fixtures DIR] [--port 8767] [--latency 0.2] [--bandwidth 5]
+                                     [--append-every 60]
+    DASHBOARD_CKAN_URL=http://127.0.0.1:8767 DASHBOARD_REFRESH_INTERVAL=10 streamlit run modified-dashboard.py
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+import ckan_data
+from benchmarks import synthetic
+
+OUTBREAKS_PACKAGE = ckan_data.OUTBREAK_CAREHOME_DATASET[1]["id"]
+COVID_CASES_PACKAGE = ckan_data.COVID_CASES_DATASET[1]["id"]
+
+
+def synthetic_packages(paths, suffix=""):
+    # The two CKAN packages the dashboards download, each with one resource, from synthetic.write_datasets paths.
+    return {OUTBREAKS_PACKAGE: {"outbreaks" + suffix: paths["outbreaks"]},
+            COVID_CASES_PACKAGE: {"covid-cases" + suffix: paths["covid_cases"]}}
+
+
+def fixture_paths(directory):
+    """The outbreaks.csv and covid_cases.csv fixtures in directory, in the CKAN dump layout."""
+    paths = {name: os.path.join(directory, name + ".csv") for name in ("outbreaks", "covid_cases")}
+    missing = [path for path in paths.values() if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError("missing fixture CSVs: %s" % ", ".join(missing))
+    return paths
+
+
+class LocalCkan:
+    """Serve {package id: {resource id: csv path}} on 127.0.0.1.
+
+    Resource metadata (last_modified, size) follows the file, so rewriting a CSV looks like a
+    CKAN datastore update to the dashboard's cache. `latency` seconds are added to every response
+    and dumps are sent at `bandwidth` bytes per second (default: unthrottled), to replay a remote portal.
+    """
+
+    def __init__(self, packages, host="127.0.0.1", port=0, latency=0.0, bandwidth=None):
+        self.packages = packages
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def dataset(self, package_id):
+        # [base_url, params] in the form ckan_data.get_data expects.
+        return [self.url, {"id": package_id}]
+
+    def resource_path(self, resource_id):
+        for resources in self.packages.values():
+            if resource_id in resources:
+                return resources[resource_id]
+        return None
+
+    def resource_metadata(self, resource_id):
+        path = self.resource_path(resource_id)
+        stat = os.stat(path)
+        return {"id": resource_id, "datastore_active": True, "last_modified": str(stat.st_mtime_ns),
+                "size": stat.st_size}
+
+    def append(self, resource_id, rows):
+        """Publish rows (same columns as the CSV) at the end of a resource, as a CKAN datastore upsert would."""
+        with self.lock:
+            rows.to_csv(self.resource_path(resource_id), mode="a", header=False, index=False)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="local-ckan", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler(self):
+        ckan = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, payload, status=200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def not_found(self):
+                self.send_json({"success": False, "error": {"message": "Not found"}}, status=404)
+
+            def do_GET(self):
+                if ckan.latency:
+                    time.sleep(ckan.latency)
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if url.path == "/api/3/action/package_show":
+                    resources = ckan.packages.get(query.get("id"))
+                    if resources is None:
+                        return self.not_found()
+                    return self.send_json({"success": True, "result": {
+                        "resources": [ckan.resource_metadata(resource_id) for resource_id in resources]}})
+                if url.path == "/api/3/action/datastore_search":
+                    return self.datastore_search(query)
+                if url.path.startswith("/datastore/dump/"):
+                    return self.dump(url.path.rsplit("/", 1)[1])
+                return self.not_found()
+
+            def datastore_search(self, query):
+                path = ckan.resource_path(query.get("resource_id"))
+                if path is None:
+                    return self.not_found()
+                with ckan.lock:
+                    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+                offset, limit = int(query.get("offset", 0)), int(query.get("limit", 100))
+                page = df.iloc[offset:offset + limit]
+                if query.get("records_format") == "csv":
+                    records = page.to_csv(index=False, header=False)
+                else:
+                    records = page.to_dict("records")
+                self.send_json({"success": True, "result": {
+                    "fields": [{"id": column} for column in df.columns], "total": len(df), "records": records}})
+
+            def dump(self, resource_id):
+                path = ckan.resource_path(resource_id)
+                if path is None:
+                    return self.not_found()
+                with ckan.lock, open(path, "rb") as f:
+                    body = f.read()
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if not ckan.bandwidth:
+                    return self.wfile.write(body)
+                chunk = 64 * 1024
+                for start in range(0, len(body), chunk):
+                    self.wfile.write(body[start:start + chunk])
+                    time.sleep(min(chunk, len(body) - start) / ckan.bandwidth)
+
+        return Handler
+
+
+def publish_outbreaks(server, resource_id, rows, seed):
+    # New outbreaks continue the resource's _id sequence, the way CKAN numbers appended rows.
+    path = server.resource_path(resource_id)
+    with server.lock:
+        last_id = pd.read_csv(path, usecols=["_id"])["_id"].max()
+    batch = synthetic.outbreaks(seed=seed).head(rows)
+    batch["_id"] = range(last_id + 1, last_id + 1 + len(batch))
+    server.append(resource_id, batch)
+    return len(batch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the synthetic datasets from a local stand-in CKAN")
+    parser.add_argument("--scale", type=float, default=1, help="dataset scale (see benchmarks/synthetic.py)")
+    parser.add_argument("--fixtures", help="serve outbreaks.csv and covid_cases.csv from this directory instead")
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every response")
+    parser.add_argument("--bandwidth", type=float, default=0, help="dump speed in MB/s (default: unthrottled)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--append-every", type=float, default=0,
+                        help="publish new outbreak rows every this many seconds (default: never)")
+    parser.add_argument("--append-rows", type=int, default=10, help="outbreak rows per publish")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="local-ckan-") as workdir:
+        paths = fixture_paths(args.fixtures) if args.fixtures else synthetic.write_datasets(workdir, args.scale)
+        with LocalCkan(synthetic_packages(paths), host=args.host, port=args.port, latency=args.latency,
+                       bandwidth=args.bandwidth * 1024 * 1024 or None) as server:
+            print("serving CKAN on %s (DASHBOARD_CKAN_URL=%s)" % (server.url, server.url), flush=True)
+            seed = 0
+            try:
+                while True:
+                    if not args.append_every:
+                        time.sleep(3600)
+                        continue
+                    time.sleep(args.append_every)
+                    seed += 1
+                    added = publish_outbreaks(server, "outbreaks", args.append_rows, seed)
+                    print("published %d outbreak rows" % added, flush=True)
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+"""Load-test a dashboard with many concurrent sessions against a local stand-in CKAN.
+
+Starts the local CKAN (see benchmarks/ckan_server.py) with the synthetic datasets or fixture CSVs,
+runs the dashboard as its own server process pointed at it, and drives N concurrent sessions at
+each level, each clicking through the dashboard's filters:
+
+    python -m benchmarks.load streamlit [--sessions 1,5,10,25] [--interactions 20] [--scale 1]
+    python -m benchmarks.load dash --workers 4 [--sessions 1,5,10,25] [--latency 0.2] [--bandwidth 5]
+
+Streamlit sessions speak the browser's websocket protocol to modified-dashboard.py: every
+interaction changes one date input, radio, multiselect or selectbox to a random value and is timed
+until the rerun finishes. Dash sessions post the main.py dropdown and date picker changes to the
+update_graphs callback. Per level it reports the page load and interaction latency percentiles and
+the peak memory (PSS, summed over the server's processes) of the dashboard server. The server keeps
+running across levels, so levels after the first are measured with warm caches; other DASHBOARD_*
+settings in the environment are passed on to it.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest
+from tornado.websocket import websocket_connect
+
+from benchmarks import synthetic
+from benchmarks.ckan_server import LocalCkan, fixture_paths, synthetic_packages
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_TIMEOUT = 600  # seconds; the Dash app parses its data before it listens
+MAX_MESSAGE_BYTES = 200 * 1024 * 1024  # Streamlit's default server.maxMessageSize
+
+# The widgets a Streamlit session changes. Buttons (refresh, downloads) are left alone, and so are the
+# download format pickers, which only matter once a download is prepared.
+STREAMLIT_WIDGETS = ("date_input", "radio", "multiselect", "selectbox")
+SKIPPED_LABELS = ("Format",)
+DATE_FORMAT = "%Y/%m/%d"  # how Streamlit's frontend sends date_input values
+
+# The main.py filters, all inputs of its update_graphs callback.
+DASH_SETTINGS = "outbreak-setting-dropdown"
+DASH_CAUSES = "outbreak-cause-dropdown"
+DASH_DATES = "date-range-picker"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(pid):
+    # pid and all its descendants, from the parent ids in /proc/<pid>/stat.
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/%s/stat" % entry) as f:
+                stat = f.read()
+        except OSError:
+            continue
+        parents.setdefault(int(stat.rsplit(")", 1)[1].split()[1]), []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(parents.get(current, []))
+    return tree
+
+
+def memory_mb(pid):
+    """Proportional set size of pid and its descendants in MB, so pages forked workers share count once."""
+    total = 0
+    for member in process_tree(pid):
+        try:
+            with open("/proc/%d/smaps_rollup" % member) as f:
+                total += int(re.search(r"^Pss:\s+(\d+) kB", f.read(), re.M).group(1))
+        except (OSError, AttributeError):
+            continue
+    return total / 1024
+
+
+def report_fixture(outbreaks_path, path):
+    # main.py reads ob_report_2023.csv from its working directory, in the report's layout rather than CKAN's.
+    df = pd.read_csv(outbreaks_path, dtype=str, keep_default_na=False)
+    for column in ("Date Outbreak Began", "Date Declared Over"):
+        df[column] = pd.to_datetime(df[column], errors="coerce").dt.strftime("%m/%d/%y").fillna("")
+    df = df.rename(columns={"Causative Agent - 1": "Causative Agent-1", "Causative Agent - 2": "Causative Agent-2"})
+    df.to_csv(path, index=False)
+
+
+class DashboardServer:
+    """The dashboard under test, in its own process with private cache, snapshot and shared directories."""
+
+    def __init__(self, target, workdir, ckan_url, outbreaks_path, workers=1):
+        self.port = free_port()
+        env = dict(os.environ, PYTHONPATH=REPO, DASHBOARD_CKAN_URL=ckan_url,
+                   DASHBOARD_CACHE_DIR=os.path.join(workdir, "cache"),
+                   DASHBOARD_SNAPSHOT_DIR=os.path.join(workdir, "snapshots"),
+                   DASHBOARD_SHARED_DIR=os.path.join(workdir, "shared"))
+        if target == "streamlit":
+            command = [sys.executable, "-m", "streamlit", "run", "modified-dashboard.py", "--server.headless", "true",
+                       "--server.port", str(self.port), "--server.address", "127.0.0.1",
+                       "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"]
+            cwd, self.health = REPO, "/_stcore/health"
+        else:
+            command = [sys.executable, os.path.join(REPO, "serve.py"), "--workers", str(workers),
+                       "--bind", "127.0.0.1:%d" % self.port]
+            cwd, self.health = workdir, "/"
+            report_fixture(outbreaks_path, os.path.join(workdir, "ob_report_2023.csv"))
+        self.log_path = os.path.join(workdir, "server.log")
+        self.log = open(self.log_path, "w")
+        self.process = subprocess.Popen(command, cwd=cwd, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.port
+
+    async def wait_ready(self, timeout=STARTUP_TIMEOUT):
+        client = AsyncHTTPClient()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                await client.fetch(self.url + self.health, request_timeout=5)
+                return
+            except (HTTPClientError, OSError):
+                await asyncio.sleep(0.5)
+        raise SystemExit("dashboard server did not start; see %s" % self.log_path)
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
+
+
+class StreamlitSession:
+    """One browser tab: a websocket to the Streamlit server and the widget values it has set."""
+
+    def __init__(self, url, rng):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        self.BackMsg, self.ForwardMsg = BackMsg, ForwardMsg
+        self.url = url.replace("http://", "ws://") + "/_stcore/stream"
+        self.rng = rng
+        self.ws = None
+        self.widgets = {}  # widget id: (element type, widget proto) of the last run
+        self.states = {}  # widget id: WidgetState this session has set
+        self.cached = {}  # hash: ForwardMsg, for the messages the server only references when sent again
+
+    async def open(self):
+        self.ws = await websocket_connect(self.url, max_message_size=MAX_MESSAGE_BYTES)
+        return await self.rerun()
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+    async def rerun(self):
+        """Ask for a rerun with the current widget values; returns (seconds until it finished, exceptions shown)."""
+        message = self.BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        start = time.perf_counter()
+        await self.ws.write_message(message.SerializeToString(), binary=True)
+        widgets, errors = {}, 0
+        while True:
+            data = await self.ws.read_message()
+            if data is None:
+                raise ConnectionError("the server closed the session")
+            msg = self.ForwardMsg()
+            msg.ParseFromString(data)
+            if msg.WhichOneof("type") == "ref_hash":
+                msg = self.cached[msg.ref_hash]
+            elif msg.hash:
+                self.cached[msg.hash] = msg
+            kind = msg.WhichOneof("type")
+            if kind == "script_finished":
+                if msg.script_finished != self.ForwardMsg.FINISHED_SUCCESSFULLY:
+                    errors += 1
+                break
+            if kind != "delta" or msg.delta.WhichOneof("type") != "new_element":
+                continue
+            element = msg.delta.new_element
+            element_type = element.WhichOneof("type")
+            if element_type == "exception":
+                errors += 1
+            elif element_type in STREAMLIT_WIDGETS:
+                widget = getattr(element, element_type)
+                if not widget.disabled and widget.label not in SKIPPED_LABELS:
+                    widgets[widget.id] = (element_type, widget)
+        elapsed = time.perf_counter() - start
+        # Widgets that are gone (or changed identity with their options) fall back to their defaults.
+        self.widgets = widgets
+        self.states = {widget_id: state for widget_id, state in self.states.items() if widget_id in widgets}
+        return elapsed, errors
+
+    def change_widget(self):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        choices = [(widget_id, kind, widget) for widget_id, (kind, widget) in self.widgets.items()
+                   if kind == "date_input" or len(widget.options) > 1]
+        if not choices:
+            return False
+        widget_id, kind, widget = self.rng.choice(choices)
+        state = WidgetState(id=widget_id)
+        if kind == "date_input":
+            # Somewhere in the two years before the widget's default, within the dates it allows.
+            default = datetime.datetime.strptime(widget.default[0], DATE_FORMAT).date()
+            earliest = default - datetime.timedelta(days=730)
+            if widget.min:
+                earliest = max(earliest, datetime.datetime.strptime(widget.min, DATE_FORMAT).date())
+            day = earliest + datetime.timedelta(days=self.rng.randint(0, max((default - earliest).days, 0)))
+            state.string_array_value.data.append(day.strftime(DATE_FORMAT))
+        elif kind == "multiselect":
+            picked = self.rng.sample(range(len(widget.options)), self.rng.randint(1, min(3, len(widget.options))))
+            state.int_array_value.data.extend(sorted(picked))
+        else:
+            state.int_value = self.rng.randrange(len(widget.options))
+        self.states[widget_id] = state
+        return True
+
+    async def interact(self):
+        if not self.change_widget():
+            return None
+        return await self.rerun()
+
+
+class DashSession:
+    """One browser tab of the Dash app: the values of its filters, posted to the update_graphs callback."""
+
+    def __init__(self, url, rng, layout, dependency, client):
+        self.url = url
+        self.rng = rng
+        self.client = client
+        self.dependency = dependency
+        props = {}
+
+        def collect(node):
+            if isinstance(node, list):
+                for child in node:
+                    collect(child)
+            elif isinstance(node, dict):
+                if "id" in node.get("props", {}):
+                    props[node["props"]["id"]] = node["props"]
+                for value in node.get("props", {}).values():
+                    collect(value)
+                if "props" not in node:
+                    for value in node.values():
+                        collect(value)
+
+        collect(layout)
+        self.settings = [option["value"] for option in props[DASH_SETTINGS]["options"]]
+        self.causes = [option["value"] for option in props[DASH_CAUSES]["options"]]
+        dates = props[DASH_DATES]
+        self.first = pd.Timestamp(dates["min_date_allowed"])
+        self.last = pd.Timestamp(dates["max_date_allowed"])
+        self.values = {(DASH_SETTINGS, "value"): None, (DASH_CAUSES, "value"): None,
+                       (DASH_DATES, "start_date"): dates.get("start_date"),
+                       (DASH_DATES, "end_date"): dates.get("end_date")}
+
+    async def open(self):
+        # The page itself: the layout and callback graph a browser fetches before the first callback.
+        start = time.perf_counter()
+        await self.client.fetch(self.url + "/_dash-layout")
+        await self.client.fetch(self.url + "/_dash-dependencies")
+        return time.perf_counter() - start, 0
+
+    async def interact(self):
+        changed = self.rng.choice(list(self.values))
+        if changed[1] == "value":
+            options = self.settings if changed[0] == DASH_SETTINGS else self.causes
+            self.values[changed] = self.rng.sample(options, self.rng.randint(1, min(3, len(options))))
+        else:
+            span = max((self.last - self.first).days, 1)
+            day = self.first + pd.Timedelta(days=self.rng.randrange(span))
+            self.values[changed] = day.strftime("%Y-%m-%d")
+        dependency = self.dependency
+        body = {"output": dependency["output"],
+                "outputs": [{"id": output.rsplit(".", 1)[0], "property": output.rsplit(".", 1)[1]}
+                            for output in dependency["output"].strip(".").split("...")],
+                "inputs": [dict(item, value=self.values[(item["id"], item["property"])])
+                           for item in dependency["inputs"]],
+                "state": [], "changedPropIds": ["%s.%s" % changed]}
+        request = HTTPRequest(self.url + "/_dash-update-component", method="POST", body=json.dumps(body),
+                              headers={"Content-Type": "application/json"}, request_timeout=600)
+        start = time.perf_counter()
+        try:
+            await self.client.fetch(request)
+            errors = 0
+        except HTTPClientError:
+            errors = 1
+        return time.perf_counter() - start, errors
+
+    def close(self):
+        pass
+
+
+async def dash_session_factory(url, sessions):
+    client = AsyncHTTPClient(force_instance=True, max_clients=max(sessions, 10))
+    layout = json.loads((await client.fetch(url + "/_dash-layout")).body)
+    dependencies = json.loads((await client.fetch(url + "/_dash-dependencies")).body)
+    dependency = next(d for d in dependencies if [i["id"] for i in d["inputs"]][:1] == [DASH_SETTINGS])
+    return lambda rng: DashSession(url, rng, layout, dependency, client)
+
+
+async def run_session(make_session, rng, interactions, think, delay, results):
+    await asyncio.sleep(delay)
+    session = make_session(rng)
+    try:
+        seconds, errors = await session.open()
+        results["load"].append(seconds)
+        results["errors"] += errors
+        for _ in range(interactions):
+            await asyncio.sleep(rng.uniform(0, 2 * think))
+            outcome = await session.interact()
+            if outcome is None:
+                continue
+            seconds, errors = outcome
+            results["interactions"].append(seconds)
+            results["errors"] += errors
+    except (ConnectionError, OSError, HTTPClientError) as e:
+        results["failed"].append(repr(e))
+    finally:
+        session.close()
+
+
+async def sample_memory(pid, peak, stop, every=0.5):
+    while not stop.is_set():
+        peak[0] = max(peak[0], memory_mb(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), every)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_level(make_session, server, sessions, args, seed):
+    results = {"load": [], "interactions": [], "errors": 0, "failed": []}
+    peak, stop = [memory_mb(server.process.pid)], asyncio.Event()
+    sampler = asyncio.ensure_future(sample_memory(server.process.pid, peak, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*[run_session(make_session, random.Random(seed * 1000 + i), args.interactions, args.think,
+                                       args.ramp * i / sessions, results) for i in range(sessions)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    def percentiles(values):
+        return [round(float(v) * 1000, 1) for v in np.percentile(values, [50, 95, 99])] if values else [None] * 3
+
+    load, interaction = percentiles(results["load"]), percentiles(results["interactions"])
+    return {"sessions": sessions, "seconds": round(elapsed, 2), "interactions": len(results["interactions"]),
+            "errors": results["errors"], "failed_sessions": len(results["failed"]),
+            "load_p50_ms": load[0], "load_p95_ms": load[1],
+            "p50_ms": interaction[0], "p95_ms": interaction[1], "p99_ms": interaction[2],
+            "server_peak_mb": round(peak[0], 1)}
+
+
+def print_row(row):
+    def ms(value):
+        return "%10.1f" % value if value is not None else "%10s" % "-"
+    print("%8d %8d %6d %6d %s %s %s %s %s %12.1f" % (
+        row["sessions"], row["interactions"], row["errors"], row["failed_sessions"], ms(row["load_p50_ms"]),
+        ms(row["load_p95_ms"]), ms(row["p50_ms"]), ms(row["p95_ms"]), ms(row["p99_ms"]), row["server_peak_mb"]),
+        flush=True)
+
+
+async def run(args):
+    levels = [int(n) for n in args.sessions.split(",")]
+    with tempfile.TemporaryDirectory(prefix="dashboard-load-") as workdir:
+        paths = (fixture_paths(args.fixtures) if args.fixtures
+                 else synthetic.write_datasets(os.path.join(workdir, "data"), args.scale))
+        bandwidth = args.bandwidth * 1024 * 1024 or None
+        with LocalCkan(synthetic_packages(paths), latency=args.latency, bandwidth=bandwidth) as ckan:
+            server = DashboardServer(args.target, workdir, ckan.url, paths["outbreaks"], args.workers)
+            try:
+                start = time.perf_counter()
+                await server.wait_ready()
+                if args.target == "streamlit":
+                    make_session = lambda rng: StreamlitSession(server.url, rng)  # noqa: E731
+                else:
+                    make_session = await dash_session_factory(server.url, max(levels))
+                # One session on its own first, so the CKAN downloads and cold caches are reported apart.
+                session = make_session(random.Random(args.seed))
+                cold, _ = await session.open()
+                session.close()
+                print("%s server up in %.1fs, first page load %.1fs, %.1f MB" % (
+                    args.target, time.perf_counter() - start - cold, cold, memory_mb(server.process.pid)))
+                print("%8s %8s %6s %6s %10s %10s %10s %10s %10s %12s" % (
+                    "sessions", "clicks", "errors", "failed", "load p50", "load p95", "p50 ms", "p95 ms", "p99 ms",
+                    "server MB"))
+                rows = []
+                for level, sessions in enumerate(levels):
+                    rows.append(await run_level(make_session, server, sessions, args, args.seed + level + 1))
+                    print_row(rows[-1])
+            finally:
+                server.stop()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"target": args.target, "scale": args.scale, "latency": args.latency,
+                       "bandwidth": args.bandwidth, "workers": args.workers, "levels": rows}, f, indent=1)
+            f.write("\n")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("target", choices=["streamlit", "dash"], help="modified-dashboard.py or main.py")
+    parser.add_argument("--sessions", default="1,5,10,25", help="comma-separated concurrent session counts")
+    parser.add_argument("--interactions", type=int, default=20, help="filter changes per session")
+    parser.add_argument("--think", type=float, default=0.5, help="mean seconds between a session's interactions")
+    parser.add_argument("--ramp", type=float, default=0, help="seconds over which a level's sessions start")
+    parser.add_argument("--scale", type=float, default=1, help="dataset scale (see benchmarks/synthetic.py)")
+    parser.add_argument("--fixtures", help="serve outbreaks.csv and covid_cases.csv from this directory instead")
+    parser.add_argument("--latency", type=float, default=0, help="seconds the local CKAN adds to every response")
+    parser.add_argument("--bandwidth", type=float, default=0, help="CKAN dump speed in MB/s (default: unthrottled)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes serving the Dash app")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the sessions' random choices")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
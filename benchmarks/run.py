@@ -0,0 +1,283 @@
+"""Benchmark every data and chart stage of the dashboards on synthetic data.
+
+Generates the four datasets at each scale (see benchmarks/synthetic.py), serves the CKAN
+dumps from a local stand-in server and times each stage the way the dashboards run it,
+reporting wall time and peak traced memory. Results are compared to a stored baseline:
+
+    python -m benchmarks.run [--scales 1,10,100,1000] [--repeat 3] [--update-baseline]
+
+exits with status 1 when a stage is slower or larger than its baseline by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+import charts
+import ckan_data
+import exports
+import ltc_rollup
+import ltc_vaccination
+import schemas
+from benchmarks import synthetic
+from benchmarks.ckan_server import COVID_CASES_PACKAGE, OUTBREAKS_PACKAGE, LocalCkan, synthetic_packages
+from ckan_cache import ResourceCache
+from demographics import demographic_crosstabs
+from institution_ranking import InstitutionRanking, top_k_in_cube
+from outbreak_cube import build_outbreak_cube, outbreaks_by_agent, outbreaks_by_date_and_type, outbreaks_by_type
+from outbreak_index import OutbreakIndex
+from outbreak_intervals import OutbreakIntervals, day_range
+
+# main.py, imported by load_dash_app() once the benchmark's workdir exists.
+dash_app = None
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+TOLERANCE = 0.5
+# Differences below these are timer and allocator noise, whatever the relative change.
+MIN_SECONDS = 0.05
+MIN_MB = 1.0
+
+
+def dashboard_filters(outbreaks):
+    # The Streamlit dashboard's defaults: the last two months, then one setting and a few of its institutions.
+    date2 = outbreaks["Date Outbreak Began"].max()
+    date1 = date2 - relativedelta(months=2)
+    recent = outbreaks[outbreaks["Date Outbreak Began"] > date1]
+    setting = recent["Outbreak Setting"].mode()[0]
+    institutions = tuple(recent.loc[recent["Outbreak Setting"] == setting, "Institution Name"].unique()[:3])
+    return date1, date2, setting, institutions
+
+
+def view_data(cube, date1, date2, setting=None, institutions=()):
+    cube_slice = cube.lookup(date1, date2, setting, institutions)
+    return (schemas.plain_labels(outbreaks_by_type(cube_slice)), schemas.plain_labels(outbreaks_by_agent(cube_slice)),
+            outbreaks_by_date_and_type(cube_slice))
+
+
+def stages(server, paths):
+    """Yield (name, fn[, setup]) in dashboard order; each fn takes and may extend the shared state dict.
+
+    setup, when given, runs untimed before every call of fn.
+    """
+
+    def fetch_outbreaks(state):
+        state["outbreaks"] = ckan_data.get_data(server.dataset(OUTBREAKS_PACKAGE), force_refresh=True)
+        state["filters"] = dashboard_filters(state["outbreaks"])
+
+    def fetch_covid_cases(state):
+        state["covid_cases"] = ckan_data.get_data(server.dataset(COVID_CASES_PACKAGE), force_refresh=True)
+
+    def read_ltc_summary(state):
+        state["ltc_summary"] = schemas.read_csv(paths["ltc_summary"], schemas.LTC_SUMMARY_SCHEMA)
+
+    def read_ltc_vaccination(state):
+        state["ltc_vaccination"] = schemas.read_csv(paths["ltc_vaccination"], schemas.LTC_VACCINATION_SCHEMA)
+
+    def build_index(state):
+        state["index"] = OutbreakIndex(state["outbreaks"])
+
+    def filter_rows(state):
+        date1, date2, setting, institutions = state["filters"]
+        state["index"].lookup(date1, date2)
+        state["index"].lookup(date1, date2, setting)
+        state["filtered"] = state["index"].lookup(date1, date2, setting, institutions)
+
+    def build_cube(state):
+        state["cube"] = OutbreakIndex(build_outbreak_cube(state["outbreaks"]))
+
+    def aggregate_view_data(state):
+        date1, date2, setting, institutions = state["filters"]
+        state["view_data"] = view_data(state["cube"], date1, date2)
+        view_data(state["cube"], date1, date2, setting)
+        view_data(state["cube"], date1, date2, setting, institutions)
+
+    def build_intervals(state):
+        state["intervals"] = OutbreakIntervals(state["outbreaks"])
+
+    def active_counts(state):
+        # Every day of the outbreak history, split by outbreak type.
+        outbreaks = state["outbreaks"]["Date Outbreak Began"]
+        days = day_range(outbreaks.min(), outbreaks.max())
+        state["active_counts"] = state["intervals"].active_counts(days, "Type of Outbreak")
+
+    def build_ranking(state):
+        state["ranking"] = InstitutionRanking()
+        state["ranking"].sync(state["outbreaks"])
+
+    def count_all_but_last_rows(state):
+        # Counts as of before a delta sync that appended 1% more outbreaks.
+        outbreaks = state["outbreaks"]
+        state["stale_ranking"] = InstitutionRanking()
+        state["stale_ranking"].sync(outbreaks.iloc[:len(outbreaks) - max(1, len(outbreaks) // 100)])
+
+    def top_in_filter(state):
+        date1, date2, setting, _ = state["filters"]
+        top_k_in_cube(state["cube"].lookup(date1, date2, setting), 20)
+
+    def daily_totals(state):
+        state["ltc_daily"] = ltc_rollup.daily_totals(state["ltc_summary"])
+
+    def ltc_rollups(state):
+        rollups = {period: ltc_rollup.rollup(state["ltc_daily"], period) for period in ltc_rollup.PERIODS}
+        state["ltc_rollup"] = rollups["Month"]
+
+    def vaccination_join(state):
+        totals = ltc_vaccination.area_totals(state["ltc_vaccination"])
+        state["vaccination_summary"] = ltc_vaccination.join_summary(state["ltc_summary"],
+                                                                    ltc_vaccination.date_rates(totals))
+
+    def crosstabs(state):
+        state["demographics"] = demographic_crosstabs(state["covid_cases"])
+
+    yield "get_data.outbreaks", fetch_outbreaks
+    yield "get_data.covid_cases", fetch_covid_cases
+    yield "read.ltc_summary", read_ltc_summary
+    yield "read.ltc_vaccination", read_ltc_vaccination
+    yield "filter.build_index", build_index
+    yield "filter.lookup", filter_rows
+    yield "cube.build", build_cube
+    yield "cube.view_data", aggregate_view_data
+    for export_format in exports.FORMATS:
+        # The raw outbreak rows, the largest export the dashboard offers.
+        yield ("export[%s]" % export_format,
+               lambda state, export_format=export_format: exports.export(state["outbreaks"], export_format))
+    yield "intervals.build", build_intervals
+    yield "intervals.active_counts", active_counts
+    yield "chart.active_outbreaks", lambda state: charts.active_outbreaks_figure(state["active_counts"])
+    yield "chart.outbreaks_line", lambda state: charts.outbreaks_line_figure(state["view_data"][2])
+    yield "chart.causative_agent_bar", lambda state: charts.causative_agent_bar_figure(state["view_data"][1])
+    yield "ltc.daily_totals", daily_totals
+    yield "ltc.rollup", ltc_rollups
+    for option in charts.TIME_SERIES_OPTIONS:
+        yield ("chart.time_series[%s]" % option,
+               lambda state, option=option: charts.time_series_figure(state["ltc_rollup"], option))
+    yield "ltc.vaccination_join", vaccination_join
+    yield "ranking.build", build_ranking
+    yield "ranking.sync_append", lambda state: state["stale_ranking"].sync(state["outbreaks"]), count_all_but_last_rows
+    yield "ranking.top", lambda state: state["ranking"].top(20)
+    yield "ranking.top_in_filter", top_in_filter
+    yield ("chart.outbreaks_by_institution",
+           lambda state: charts.outbreaks_by_institution_figure(state["ranking"].top(20)))
+    yield "chart.case_comparison", lambda state: charts.case_comparison_figure(state["ltc_summary"])
+    yield "demographics.crosstabs", crosstabs
+    for option in charts.DEMOGRAPHIC_OPTIONS:
+        yield ("chart.covid_demographics[%s]" % option,
+               lambda state, option=option: charts.covid_demographics_figure(state["demographics"][option], option))
+    yield "dash.update_graphs", update_graphs
+    yield "dash.update_graphs[filtered]", update_graphs_filtered
+
+
+def load_dash_app(workdir):
+    # main.py shares callback results through DASHBOARD_SHARED_DIR and the update_graphs stages clear them, so
+    # it is imported with a directory of its own rather than the one a running Dash server may be using.
+    global dash_app
+    os.environ["DASHBOARD_SHARED_DIR"] = os.path.join(workdir, "shared")
+    import main
+    dash_app = main
+
+
+def update_graphs(state, settings=None, causes=None):
+    dash_app.df = state["outbreaks"]
+    dash_app.aggregate_outbreaks.cache_clear()
+    dash_app.result_cache.clear()
+    dash_app.update_graphs(settings, causes, None, None)
+
+
+def update_graphs_filtered(state):
+    outbreaks = state["outbreaks"]
+    update_graphs(state, [outbreaks["Outbreak Setting"].mode()[0]], [outbreaks["Causative Agent-1"].mode()[0]])
+
+
+def measure(fn, state, repeat, setup=None):
+    # Best of `repeat` untraced runs for time, then one run under tracemalloc for peak memory.
+    seconds = []
+    for _ in range(repeat):
+        if setup:
+            setup(state)
+        start = time.perf_counter()
+        fn(state)
+        seconds.append(time.perf_counter() - start)
+    if setup:
+        setup(state)
+    tracemalloc.start()
+    try:
+        fn(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(min(seconds), 4), "peak_mb": round(peak / 2 ** 20, 2)}
+
+
+def run_scale(scale, repeat, workdir):
+    paths = synthetic.write_datasets(os.path.join(workdir, "scale-%s" % scale), scale)
+    results = {}
+    with LocalCkan(synthetic_packages(paths, "-%s" % scale)) as server:
+        state = {}
+        for name, fn, *setup in stages(server, paths):
+            results[name] = measure(fn, state, repeat, *setup)
+            print("%8s  %-48s %10.1f ms %10.1f MB" % (scale, name, results[name]["seconds"] * 1000,
+                                                    results[name]["peak_mb"]), flush=True)
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for scale, stages_at_scale in results.items():
+        for name, current in stages_at_scale.items():
+            previous = baseline.get(scale, {}).get(name)
+            if previous is None:
+                continue
+            for metric, floor in (("seconds", MIN_SECONDS), ("peak_mb", MIN_MB)):
+                limit = previous[metric] * (1 + tolerance)
+                if current[metric] > limit and current[metric] - previous[metric] > floor:
+                    found.append((scale, name, metric, previous[metric], current[metric]))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="1,10,100,1000",
+                        help="comma-separated dataset scales (default 1,10,100,1000)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage; the fastest is kept")
+    parser.add_argument("--baseline", default=BASELINE, help="stored results to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed relative slowdown or growth before a stage fails (default 0.5)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="dashboard-bench-") as workdir:
+        # Downloads go to a throwaway cache so the benchmark never touches the dashboard's own.
+        ckan_data.resource_cache = ResourceCache(os.path.join(workdir, "cache"))
+        load_dash_app(workdir)
+        results = {scale: run_scale(float(scale) if "." in scale else int(scale), args.repeat, workdir)
+                   for scale in args.scales.split(",")}
+
+    if args.update_baseline:
+        baseline = {"python": platform.python_version(), "pandas": pd.__version__, "machine": platform.machine(),
+                    "results": results}
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+            f.write("\n")
+        print("baseline written to %s" % args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline at %s; run with --update-baseline to create one" % args.baseline)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    found = regressions(results, baseline, args.tolerance)
+    for scale, name, metric, previous, current in found:
+        print("REGRESSION scale %s %s: %s %.4g -> %.4g" % (scale, name, metric, previous, current))
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import schemas
+
+# Synthetic copies of every dataset the dashboards read, in the raw layout each one is read
+# from: the two CKAN datastore dumps and the two LTC CSV files. Scale 1 has the row counts
+# of the files in this repository (and a 1000-row sample of the COVID case dump); scale N
+# has N times as many rows drawn from the same value distributions over the same date span.
+BASE_ROWS = {"outbreaks": 612, "covid_cases": 1000, "ltc_summary": 987, "ltc_vaccination": 3091}
+
+OUTBREAKS_SEED = "ob_report_2023.csv"
+OUTBREAKS_SPAN = ("2016-01-01", "2023-09-20")
+
+# Value pools for the COVID case dump, which has no local seed file.
+CASE_VALUES = {
+    "Outbreak Associated": ["Sporadic", "Outbreak Associated"],
+    "Neighbourhood Name": ["Annex", "Rosedale", "Moss Park", "Woburn", "Malvern", "High Park-Swansea", "Weston"],
+    "FSA": ["M4W", "M5R", "M5A", "M1G", "M1B", "M6R", "M9N"],
+    "Source of Infection": ["Household Contact", "Community", "Outbreaks, Congregate Settings",
+                            "Outbreaks, Healthcare Institutions", "Close Contact", "Travel", "No Information",
+                            "Pending"],
+    "Classification": ["CONFIRMED", "PROBABLE"],
+    "Client Gender": ["FEMALE", "MALE", "UNKNOWN", "NON-BINARY", "NOT LISTED, PLEASE SPECIFY"],
+    "Outcome": ["RESOLVED", "FATAL", "ACTIVE"],
+    "Ever Hospitalized": ["No", "Yes"],
+    "Ever in ICU": ["No", "Yes"],
+    "Ever Intubated": ["No", "Yes"],
+}
+CASE_WEIGHTS = {
+    "Outbreak Associated": [0.8, 0.2],
+    "Source of Infection": [0.25, 0.3, 0.08, 0.1, 0.12, 0.03, 0.1, 0.02],
+    "Client Gender": [0.52, 0.46, 0.015, 0.003, 0.002],
+    "Outcome": [0.96, 0.03, 0.01],
+    "Ever Hospitalized": [0.95, 0.05],
+    "Ever in ICU": [0.99, 0.01],
+    "Ever Intubated": [0.995, 0.005],
+}
+AGE_WEIGHTS = [0.08, 0.2, 0.18, 0.15, 0.14, 0.1, 0.06, 0.05, 0.04]
+
+
+def rows(name, scale):
+    return int(BASE_ROWS[name] * scale)
+
+
+def spread_dates(n, start, end):
+    # n ascending dates evenly covering [start, end]; large n repeats days rather than extending the span.
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    return pd.to_datetime(np.linspace(start.value, end.value, n).astype("int64")).normalize()
+
+
+def outbreaks(scale=1, seed=0):
+    """CKAN dump layout of the outbreak report: ISO dates, "Causative Agent - 1" column names."""
+    rng = np.random.default_rng(seed)
+    source = pd.read_csv(OUTBREAKS_SEED, dtype=str, keep_default_na=False)
+    n = rows("outbreaks", scale)
+    df = source.sample(n, replace=True, random_state=seed, ignore_index=True)
+    # More outbreaks also means more institutions, but sub-linearly: homes report repeatedly.
+    variants = max(1, int(round(np.sqrt(scale))))
+    if variants > 1:
+        unit = rng.integers(0, variants, n)
+        df["Institution Name"] = np.where(unit > 0, df["Institution Name"] + " - Unit " + unit.astype(str),
+                                          df["Institution Name"])
+    began = spread_dates(n, *OUTBREAKS_SPAN)[::-1]
+    duration = pd.to_timedelta(rng.integers(7, 60, n), unit="D")
+    over = (began + duration).strftime("%Y-%m-%d")
+    df["Active"] = np.where(began + duration > pd.Timestamp(OUTBREAKS_SPAN[1]), "Y", "N")
+    df["Date Outbreak Began"] = began.strftime("%Y-%m-%d")
+    df["Date Declared Over"] = np.where(df["Active"] == "Y", "", over)
+    df["_id"] = np.arange(1, n + 1)
+    return df.rename(columns={"Causative Agent-1": "Causative Agent - 1", "Causative Agent-2": "Causative Agent - 2"})
+
+
+def covid_cases(scale=1, seed=0):
+    """CKAN dump layout of the COVID-19 cases in Toronto dataset."""
+    rng = np.random.default_rng(seed)
+    n = rows("covid_cases", scale)
+    df = pd.DataFrame({"_id": np.arange(1, n + 1), "Assigned_ID": np.arange(1, n + 1)})
+    for column, values in CASE_VALUES.items():
+        df[column] = rng.choice(values, n, p=CASE_WEIGHTS.get(column))
+    df["Age Group"] = rng.choice(schemas.AGE_GROUPS, n, p=AGE_WEIGHTS)
+    episode = pd.Timestamp("2020-01-21") + pd.to_timedelta(rng.integers(0, 1300, n), unit="D")
+    df["Episode Date"] = episode.strftime("%Y-%m-%d")
+    df["Reported Date"] = (episode + pd.to_timedelta(rng.integers(0, 5, n), unit="D")).strftime("%Y-%m-%d")
+    return df[["_id", "Assigned_ID", "Outbreak Associated", "Age Group", "Neighbourhood Name", "FSA",
+               "Source of Infection", "Classification", "Episode Date", "Reported Date", "Client Gender",
+               "Outcome", "Ever Hospitalized", "Ever in ICU", "Ever Intubated"]]
+
+
+def _resample_ltc(path, name, scale, seed):
+    # Rows drawn from the real file, re-dated evenly across its own date span.
+    source = pd.read_csv(path, encoding="ISO-8859-1", dtype=str, keep_default_na=False)
+    date_column = source.columns[0]
+    dates = pd.to_datetime(source[date_column], format="%Y-%m-%d")
+    df = source.sample(rows(name, scale), replace=True, random_state=seed, ignore_index=True)
+    df[date_column] = spread_dates(len(df), dates.min(), dates.max()).strftime("%Y-%m-%d")
+    return df
+
+
+def ltc_summary(scale=1, seed=0):
+    return _resample_ltc("covidsummary.csv", "ltc_summary", scale, seed)
+
+
+def ltc_vaccination(scale=1, seed=0):
+    return _resample_ltc("ltc_immunization_data.csv", "ltc_vaccination", scale, seed)
+
+
+GENERATORS = {"outbreaks": outbreaks, "covid_cases": covid_cases, "ltc_summary": ltc_summary,
+              "ltc_vaccination": ltc_vaccination}
+# The LTC files are Latin-1 with a UTF-8 BOM read as text, which round-trips through Latin-1 unchanged.
+ENCODINGS = {"ltc_summary": schemas.LTC_SUMMARY_SCHEMA["encoding"],
+             "ltc_vaccination": schemas.LTC_VACCINATION_SCHEMA["encoding"]}
+
+
+def write_datasets(directory, scale=1, seed=0):
+    """Write every synthetic dataset as CSV under directory; returns {name: path}."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name, generate in GENERATORS.items():
+        paths[name] = os.path.join(directory, name + ".csv")
+        generate(scale, seed).to_csv(paths[name], index=False, encoding=ENCODINGS.get(name, "utf-8"))
+    return paths
@@ -0,0 +1,276 @@
+from datetime import date
+
+import plotly.express as px
+import plotly.graph_objs as go
+
+from demographics import DEMOGRAPHIC_COLUMNS
+from downsample import line_trace, scatter_render_mode
+from instrumentation import timed
+from ltc_rollup import ACTIVE_OUTBREAKS, AVERAGE_HCW_CASES, AVERAGE_RESIDENT_CASES, RESIDENT_DEATHS
+
+# Figure builders for the Streamlit dashboard. They take plain frames and return Plotly
+# figures (plus any table shown next to them), so they can be timed outside Streamlit.
+TIME_SERIES_OPTIONS = ["Health Worker and Resident Cases", "Active Outbreaks", "Resident Deaths"]
+DEMOGRAPHIC_OPTIONS = list(DEMOGRAPHIC_COLUMNS)
+
+
+@timed("chart.outbreaks_line.build")
+def outbreaks_line_figure(df_outbreak_type_by_date):
+    fig1 = px.line()
+    for col in df_outbreak_type_by_date.columns:
+        # Long date ranges are reduced to a pixel-sized point budget (LTTB) and drawn with WebGL when large.
+        fig1.add_trace(line_trace(x=df_outbreak_type_by_date.index.values, y=df_outbreak_type_by_date[col].values,
+                                  name=col,
+                                  line=dict(shape='linear'),
+                                  connectgaps=True,
+                                  ))
+
+    fig1['layout'].update(
+        yaxis=dict(title="Number of Outbreaks", titlefont=dict(size=19)),
+        margin=dict(l=10, r=10, t=30, b=20),
+        hoverlabel=dict(
+            bgcolor="white",
+            font_color="black",
+            font_size=15,
+        ))
+    fig1.update_traces(
+        hovertemplate="<br>".join([
+            "%{x}<br>" +
+            "Number of Outbreaks: %{y}<extra></extra>"
+        ]))
+    return fig1
+
+
+@timed("chart.active_outbreaks.build")
+def active_outbreaks_figure(active_counts):
+    # active_counts: outbreaks active per day (index), one column per group, from OutbreakIntervals.
+    fig = px.line()
+    for col in active_counts.columns:
+        fig.add_trace(line_trace(x=active_counts.index.values, y=active_counts[col].values, name=col,
+                                 line=dict(shape='hv')))
+
+    fig['layout'].update(
+        yaxis=dict(title="Active Outbreaks", titlefont=dict(size=19)),
+        margin=dict(l=10, r=10, t=30, b=20),
+        showlegend=len(active_counts.columns) > 1,
+        hoverlabel=dict(
+            bgcolor="white",
+            font_color="black",
+            font_size=15,
+        ))
+    fig.update_traces(
+        hovertemplate="<br>".join([
+            "%{x}<br>" +
+            "Active Outbreaks: %{y}<extra></extra>"
+        ]))
+    return fig
+
+
+@timed("chart.causative_agent_bar.build")
+def causative_agent_bar_figure(causative_agent_df):
+    g = causative_agent_df.copy()
+    g['Percentage of Total Outbreaks'] = (g['Number of Outbreaks'] / g['Number of Outbreaks'].sum()) * 100
+
+    fig2 = px.bar(g, x='Type of Outbreak', y='Number of Outbreaks', color="Causative Agent-1",
+                  hover_name="Causative Agent-1",
+                  hover_data={'Percentage of Total Outbreaks': ':.2f',
+                              'Type of Outbreak': False,  # remove Type of Outbreak from hover data
+                              'Causative Agent-1': False,
+                              },
+                  custom_data=['Percentage of Total Outbreaks', 'Causative Agent-1']
+                  )
+    fig2.update_traces(
+        hovertemplate="<br>".join([
+            "<b>%{customdata[1]}</b><br><br>"
+            "Number of Outbreaks: %{y}<br>"
+            "Percentage of Total Outbreaks: %{customdata[0]:.2f}% <extra></extra>",
+        ])
+    )
+
+    fig2['layout'].update(
+        xaxis={'categoryorder': 'total descending'},
+        yaxis=dict(title="Total Outbreaks", titlefont=dict(size=19)),
+        margin=dict(l=20, r=20, t=30, b=20),
+        hoverlabel=dict(
+            bgcolor="white",
+            font_color="black",
+            font_size=15,
+        )
+
+    )
+    return fig2
+
+
+# line chart for various time series of Covid-19 data in Long term care homes
+@timed("chart.time_series.build")
+def time_series_figure(rollup_df, sel_filter):
+    """Figure for the selected option from an ltc_rollup.rollup() frame, and the table shown under it."""
+    options = TIME_SERIES_OPTIONS
+    fig2 = px.line()
+    if sel_filter == options[1]:
+        time_series_df = rollup_df[["Period", ACTIVE_OUTBREAKS]]
+        fig2 = px.line(time_series_df, x="Period", y=ACTIVE_OUTBREAKS,
+                       labels={ACTIVE_OUTBREAKS: "Active Outbreaks"}, height=500, width=1000,
+                       template="gridon")
+        fig2.update_traces(
+            hovertemplate="<br>".join([
+                "<b>%{x}</b><br>" +
+                "Total Active Outbreaks: %{y}<extra></extra>"
+
+            ]))
+    elif sel_filter == options[2]:
+        time_series_df = rollup_df[["Period", RESIDENT_DEATHS]]
+        fig2 = px.line(time_series_df, x="Period", y=RESIDENT_DEATHS, height=500, width=1000,
+                       template="gridon")
+        fig2.update_traces(
+            hovertemplate="<br>".join([
+                "<b>%{x}</b><br>" +
+                "Total Resident Deaths: %{y}<extra></extra>"
+
+            ]))
+        fig2.update_layout(showlegend=False)
+
+    else:
+        common_template = ('<b>%{customdata[0]} </b><br>' +
+                           'Average Cases: %{customdata[1]:.0f}<br>'
+                           )
+        time_series_df = rollup_df[["Period", AVERAGE_HCW_CASES, AVERAGE_RESIDENT_CASES]]
+
+        fig2.add_trace(go.Scatter(
+            x=time_series_df["Period"],
+            y=time_series_df[AVERAGE_HCW_CASES],
+            name="Health Workers",
+            customdata=time_series_df[["Period", AVERAGE_HCW_CASES]],
+            hovertemplate=common_template,
+
+        ))
+        fig2.add_trace(go.Scatter(
+            x=time_series_df["Period"],
+            y=time_series_df[AVERAGE_RESIDENT_CASES],
+            name="Residents",
+            customdata=time_series_df[["Period", AVERAGE_RESIDENT_CASES]],
+            hovertemplate=common_template,
+
+        ))
+
+    fig2['layout'].update(
+        xaxis=dict(title="Date", titlefont=dict(size=19)),
+        yaxis=dict(titlefont=dict(size=19)),
+        margin=dict(l=20, r=20, t=30, b=20),
+        hoverlabel=dict(
+            bgcolor="white",
+            font_color="black",
+            font_size=15,
+        ),
+
+    )
+
+    fig2.add_annotation(
+        text=f"Ontario Long-Term Care Home COVID-19 Data (open.canada.ca) / {date.today()}<br>"
+             f"Source: Government of Canada"
+        , showarrow=False
+        , x=0
+        , y=-0.15
+        , xref='paper'
+        , yref='paper'
+        , xanchor='left'
+        , yanchor='bottom'
+        , xshift=-10
+        , yshift=-60
+        , font=dict(size=10, color="grey")
+        , align="left"
+        ,
+    )
+    return fig2, time_series_df
+
+
+@timed("chart.outbreaks_by_institution.build")
+def outbreaks_by_institution_figure(dfi, period="2016-Present"):
+    # dfi is a ranking from institution_ranking: Institution Name and total outbreaks, largest first.
+    fig = px.bar(dfi, x="total outbreaks", y="Institution Name", color="total outbreaks")
+    #fig.update_traces(text=dfi["total outbreaks"])
+    fig['layout'].update(
+        title='Top %d Outbreak Numbers by Institution <br>'
+              '(%s)' % (len(dfi), period),
+        titlefont=dict(size=20),
+        xaxis=dict(title="Total Outbreaks", titlefont=dict(size=19), visible=False),
+        yaxis=dict(title="Institution Name", titlefont=dict(size=19), autorange='reversed'),
+        margin=dict(l=20, r=20, t=100, b=20),
+
+        hoverlabel=dict(
+            bgcolor="white",
+            font_color="black",
+            font_size=15,
+        ))
+    fig.update_traces(
+        hovertemplate="<br>".join([
+            "%{y}<br>" +
+            "<b>Total Outbreaks: %{x}</b><extra></extra>"
+
+        ]))
+    return fig
+
+
+@timed("chart.case_comparison.build")
+def case_comparison_figure(df_LTC_covid_summary):
+    # Create a scatter plot
+    data1 = px.scatter(df_LTC_covid_summary, x="Confirmed_Active_LTC_Resident_Cases",
+                       y="Confirmed_Active_LTC_HCW_Cases",
+                       size="Total_LTC_Resident_Deaths",
+                       render_mode=scatter_render_mode(df_LTC_covid_summary))
+
+    data1['layout'].update(
+        title="Resident Covid-19 Cases and Resident Deaths",
+        titlefont=dict(size=20), xaxis=dict(title="LTCH Resident Cases", titlefont=dict(size=19)),
+        yaxis=dict(title="LTCH Healthcare Worker Cases", titlefont=dict(size=19)),
+        margin=dict(l=20, r=20, t=100, b=20),
+
+        hoverlabel=dict(
+            bgcolor="white",
+            font_color="black",
+            font_size=15,
+        ))
+    return data1
+
+
+# Horizontal bar chart showing covid cases distribution with various filters
+@timed("chart.covid_demographics.build")
+def covid_demographics_figure(df4, sel_filter):
+    # df4 is the Age Group x sel_filter crosstab from demographics.demographic_crosstabs.
+    fig6 = px.bar(df4, orientation='h')
+    for data in fig6.data:
+        template = data.hovertemplate
+        template = template.replace(sel_filter + "=", "<b>") \
+            .replace("value=", "</b>Total Cases: ") \
+            .replace("Age Group=", "Age Group: ")
+        data.hovertemplate = template
+
+    fig6['layout'].update(
+        xaxis=dict(title="Number of Cases", titlefont=dict(size=19)),
+        yaxis=dict(title="Age Group", titlefont=dict(size=19), autorange="reversed"),
+        margin=dict(l=20, r=20, t=30, b=20),
+
+        hoverlabel=dict(
+            bgcolor="white",
+            font_color="black",
+            font_size=15,
+        )
+
+    )
+
+    fig6.add_annotation(
+        text=f"COVID-19 Cases in Toronto (open.toronto.ca) / {date.today()}<br>Source: Toronto Public Health"
+        , showarrow=False
+        , x=0
+        , y=-0.15
+        , xref='paper'
+        , yref='paper'
+        , xanchor='left'
+        , yanchor='bottom'
+        , xshift=-75
+        , yshift=-15
+        , font=dict(size=10, color="grey")
+        , align="left"
+        ,
+    )
+    return fig6
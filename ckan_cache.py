@@ -0,0 +1,110 @@
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from disk_store import evict_lru, write_atomically
+
+# Local snapshot store for CKAN datastore resources, keyed by resource id.
+# Each resource is kept as an uncompressed Arrow (Feather) file next to a small
+# JSON sidecar holding the metadata it was downloaded against. The data file's
+# modification time doubles as its last access time, so reads never write metadata.
+CACHE_DIR = os.environ.get("DASHBOARD_CACHE_DIR", ".ckan_cache")
+CACHE_MAX_BYTES = int(os.environ.get("DASHBOARD_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+
+def resource_fingerprint(resource):
+    # Fields CKAN bumps whenever the datastore behind a resource is rewritten.
+    return {
+        "last_modified": resource.get("last_modified"),
+        "metadata_modified": resource.get("metadata_modified"),
+        "datastore_cache_last_update": resource.get("datastore_cache_last_update"),
+        "size": resource.get("size"),
+    }
+
+
+class ResourceCache:
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _data_path(self, resource_id):
+        return os.path.join(self.cache_dir, resource_id + ".feather")
+
+    def _meta_path(self, resource_id):
+        return os.path.join(self.cache_dir, resource_id + ".json")
+
+    def read_meta(self, resource_id):
+        try:
+            with open(self._meta_path(resource_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, resource_id, meta):
+        def write(tmp):
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+        write_atomically(self.cache_dir, self._meta_path(resource_id), write)
+
+    def is_fresh(self, resource):
+        meta = self.read_meta(resource["id"])
+        return (meta is not None and meta["fingerprint"] == resource_fingerprint(resource)
+                and os.path.exists(self._data_path(resource["id"])))
+
+    def etag(self, resource_id):
+        meta = self.read_meta(resource_id)
+        return meta.get("etag") if meta else None
+
+    def load(self, resource_id):
+        try:
+            df = pd.read_feather(self._data_path(resource_id), use_threads=True)
+        except (OSError, pa.ArrowInvalid):
+            return None
+        try:
+            os.utime(self._data_path(resource_id))
+        except OSError:
+            pass
+        return df
+
+    def revalidate(self, resource):
+        # Server confirmed (e.g. via 304) that the stored copy is still current.
+        meta = self.read_meta(resource["id"])
+        if meta is not None:
+            meta["fingerprint"] = resource_fingerprint(resource)
+            self._write_meta(resource["id"], meta)
+
+    def store(self, resource, df, etag=None):
+        try:
+            write_atomically(self.cache_dir, self._data_path(resource["id"]),
+                             lambda tmp: df.to_feather(tmp, compression="uncompressed"))
+        except (pa.ArrowException, ValueError):
+            # Mixed-type object columns can't be written as Arrow; serve this one uncached.
+            return
+        self._write_meta(resource["id"], {
+            "fingerprint": resource_fingerprint(resource),
+            "etag": etag,
+            "stored": time.time(),
+            "rows": len(df),
+        })
+        self.evict()
+
+    def evict(self):
+        # Drop least recently used snapshots until the store fits in max_bytes.
+        evict_lru(self.cache_dir, ".feather", self.max_bytes, lambda name: self.remove(name[:-len(".feather")]))
+
+    def remove(self, resource_id):
+        for path in (self._data_path(resource_id), self._meta_path(resource_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith((".feather", ".json")):
+                os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+from ckan_cache import ResourceCache, resource_fingerprint
+from ckan_fetch import get_json, map_concurrently, open_stream, read_csv_stream
+from ckan_sync import sync_resource
+from instrumentation import propagate, span
+from schemas import DATASET_SCHEMAS, apply_schema, normalize, read_options
+
+# Point DASHBOARD_CKAN_URL at another CKAN instance, e.g. the local stand-in in benchmarks/ckan_server.py.
+CKAN_URL = os.environ.get("DASHBOARD_CKAN_URL", "https://ckan0.cf.opendata.inter.prod-toronto.ca")
+COVID_CASES_DATASET = [CKAN_URL, {"id": "covid-19-cases-in-toronto"}]
+OUTBREAK_CAREHOME_DATASET = [CKAN_URL, {"id": "outbreaks-in-toronto-healthcare-institutions"}]
+
+logger = logging.getLogger(__name__)
+
+resource_cache = ResourceCache()
+
+
+def fetch_resource(base_url, resource, schema=None, force_refresh=False, delta_sync=True):
+    # Serve the local snapshot when CKAN metadata says nothing changed since it was stored.
+    if not force_refresh and resource_cache.is_fresh(resource):
+        cached = resource_cache.load(resource["id"])
+        if cached is not None:
+            return cached
+
+    # Otherwise try to append only the rows added since the last sync.
+    if not force_refresh and delta_sync:
+        cached = resource_cache.load(resource["id"])
+        try:
+            synced = sync_resource(base_url, resource, cached, schema=schema)
+        except (requests.RequestException, KeyError, ValueError):
+            synced = None
+        if synced is not None:
+            synced = apply_schema(synced, schema)
+            resource_cache.store(resource, synced, etag=None)
+            return synced
+
+    headers = {}
+    etag = resource_cache.etag(resource["id"])
+    if etag and not force_refresh:
+        headers["If-None-Match"] = etag
+
+    # To get all records in CSV format:
+    url = base_url + "/datastore/dump/" + resource["id"]
+    response = open_stream(url, headers=headers)
+    if response.status_code == 304:
+        response.close()
+        cached = resource_cache.load(resource["id"])
+        if cached is not None:
+            resource_cache.revalidate(resource)
+            return cached
+        response = open_stream(url)
+    if not response.ok:
+        response.close()
+        response.raise_for_status()
+
+    c = apply_schema(read_csv_stream(response, name=resource["id"], **read_options(schema)), schema)
+    resource_cache.store(resource, c, etag=response.headers.get("ETag"))
+    return c
+
+
+def timed_fetch_resource(base_url, resource, schema=None, force_refresh=False, delta_sync=True):
+    start = time.perf_counter()
+    with span("ckan.fetch", resource=resource["id"]):
+        c = fetch_resource(base_url, resource, schema=schema, force_refresh=force_refresh, delta_sync=delta_sync)
+    logger.info("resource %s ready: %d rows in %.2fs", resource["id"], len(c), time.perf_counter() - start)
+    return c
+
+
+def get_data(list_url_params, force_refresh=False, delta_sync=True):
+    url = list_url_params[0] + "/api/3/action/package_show"
+    with span("ckan.package_show", package=list_url_params[1]["id"]):
+        package = get_json(url, params=list_url_params[1])
+    # for datastore_active resources:
+    resources = [resource for resource in package["result"]["resources"] if resource["datastore_active"]]
+    schema = DATASET_SCHEMAS.get(list_url_params[1]["id"])
+
+    # To get resource data, all resources of the package at once:
+    df_list = map_concurrently(
+        lambda resource: timed_fetch_resource(list_url_params[0], resource, schema=schema,
+                                              force_refresh=force_refresh, delta_sync=delta_sync),
+        resources)
+    # Resources with different category sets concat to object columns; normalizing re-types the combined frame.
+    dfs = normalize(pd.concat(df_list, ignore_index=True), schema)
+    return dfs
+
+
+def get_datasets(*datasets, force_refresh=False, delta_sync=True):
+    # Download several packages side by side; returns one frame per dataset, in order.
+    with ThreadPoolExecutor(max_workers=len(datasets), thread_name_prefix="ckan-package") as pool:
+        futures = [pool.submit(propagate(get_data), dataset, force_refresh=force_refresh, delta_sync=delta_sync)
+                   for dataset in datasets]
+        return [f.result() for f in futures]
+
+
+def dataset_version(list_url_params):
+    # Short hash of the package's resource metadata; changes whenever any resource does.
+    url = list_url_params[0] + "/api/3/action/package_show"
+    package = get_json(url, params=list_url_params[1])
+    fingerprints = [[resource["id"], resource_fingerprint(resource)]
+                    for resource in package["result"]["resources"] if resource["datastore_active"]]
+    return hashlib.sha1(json.dumps(fingerprints, sort_keys=True).encode()).hexdigest()[:12]
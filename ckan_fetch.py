@@ -0,0 +1,60 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from instrumentation import propagate, span
+
+logger = logging.getLogger(__name__)
+
+# One connection pool shared by every CKAN request the dashboard makes.
+MAX_WORKERS = int(os.environ.get("DASHBOARD_FETCH_WORKERS", "8"))
+REQUEST_TIMEOUT = (10, 120)  # (connect, read) seconds
+
+
+def make_session(pool_size=MAX_WORKERS):
+    retry = Retry(total=4, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(["GET", "HEAD"]))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+session = make_session()
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="ckan-fetch")
+
+
+def get_json(url, params=None):
+    response = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def open_stream(url, headers=None):
+    return session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT)
+
+
+def read_csv_stream(response, name=None, **read_options):
+    # Feed the socket straight into the C parser instead of buffering the whole body as bytes and str.
+    start = time.perf_counter()
+    response.raw.decode_content = True
+    try:
+        with span("ckan.download_parse", resource=name):
+            df = pd.read_csv(response.raw, encoding="utf-8", **read_options)
+    finally:
+        response.close()
+    logger.info("fetched %s: %d rows in %.2fs", name or response.url, len(df), time.perf_counter() - start)
+    return df
+
+
+def map_concurrently(fn, items):
+    # Run fn over items on the shared pool, keeping the input order of the results.
+    futures = [executor.submit(propagate(fn), item) for item in items]
+    return [f.result() for f in futures]
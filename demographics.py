@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+# Age Group x {Gender, Source of Infection, Hospitalizations} case counts for the demographics chart.
+# All three crosstabs come from one bincount over the integer category codes, computed once per
+# snapshot; switching the chart's option is then a dictionary lookup. Relabelled hospitalization values
+# and the excluded genders and sources come from the normalized dataset (schemas.COVID_CASES_SCHEMA).
+DEMOGRAPHIC_COLUMNS = {"Gender": "Client Gender", "Source of Infection": "Source of Infection",
+                       "Hospitalizations": "Ever Hospitalized"}
+
+
+def _codes(column):
+    column = column if column.dtype == "category" else column.astype("category")
+    return column.cat.codes.to_numpy().astype(np.int64), column.cat.categories
+
+
+@timed("demographics.crosstabs")
+def demographic_crosstabs(df_covid_cases):
+    """{option: Age Group x option counts}, empty rows and columns dropped and absent pairs as NaN."""
+    age, age_groups = _codes(df_covid_cases["Age Group"])
+    keep = age >= 0
+
+    # Each option gets its own block of age x label cells in one shared bincount.
+    cells, layout, offset = [], {}, 0
+    for option, column in DEMOGRAPHIC_COLUMNS.items():
+        codes, labels = _codes(df_covid_cases[column])
+        valid = keep & (codes >= 0)
+        cells.append(offset + age[valid] * len(labels) + codes[valid])
+        layout[option] = (offset, labels)
+        offset += len(age_groups) * len(labels)
+    counts = np.bincount(np.concatenate(cells), minlength=offset)
+
+    crosstabs = {}
+    for option, (start, labels) in layout.items():
+        table = counts[start:start + len(age_groups) * len(labels)].reshape(len(age_groups), len(labels))
+        rows, cols = table.any(axis=1), table.any(axis=0)
+        labels = list(labels[cols])
+        crosstabs[option] = pd.DataFrame(
+            np.where(table[rows][:, cols] > 0, table[rows][:, cols], np.nan),
+            index=pd.Index(list(age_groups[rows]), name="Age Group"),
+            columns=pd.Index(labels, name=option))
+    return crosstabs
@@ -0,0 +1,52 @@
+import os
+import tempfile
+
+# File helpers shared by the on-disk caches (ckan_cache.ResourceCache, shared_data.ResultCache), which
+# several sessions, threads or worker processes write at once.
+
+
+def write_atomically(directory, path, write):
+    """Call write(tmp) on a private temporary file in directory, then rename it to path.
+
+    Concurrent writers of the same path never share a temporary file; they just replace each other's result.
+    """
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def evict_lru(directory, suffix, max_bytes, remove=None):
+    """Delete the files ending in suffix, least recently modified first, until they total max_bytes.
+
+    remove(name) deletes an entry (with any files that go with it); by default just the file.
+    """
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith(suffix):
+            continue
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        if remove is None:
+            _remove_file(os.path.join(directory, name))
+        else:
+            remove(name)
+        total -= size
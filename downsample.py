@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import plotly.graph_objs as go
+
+# Above WEBGL_THRESHOLD points a trace is drawn with WebGL instead of SVG; line series longer
+# than POINT_BUDGET are first reduced with Largest-Triangle-Three-Buckets, which keeps peaks
+# and troughs that plain decimation would drop.
+WEBGL_THRESHOLD = int(os.environ.get("DASHBOARD_WEBGL_THRESHOLD", "2000"))
+POINT_BUDGET = int(os.environ.get("DASHBOARD_POINT_BUDGET", "1000"))
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return values.astype(float)
+
+
+def lttb_indices(x, y, n_out):
+    """Positions of the n_out points LTTB keeps from the series (x, y); x must be sorted."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = _as_float(x)
+    y = _as_float(y)
+    # First and last points are always kept; the rest are split into n_out - 2 buckets.
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.intp), n)
+    keep = np.empty(n_out, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # Twice the area of the triangle (previous pick, candidate, next bucket average).
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(x, y, budget=POINT_BUDGET):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(x) <= budget:
+        return x, y
+    present = ~np.isnan(_as_float(y))
+    x, y = x[present], y[present]
+    keep = lttb_indices(x, y, budget)
+    return x[keep], y[keep]
+
+
+def scatter_trace(x, y, threshold=WEBGL_THRESHOLD, **kwargs):
+    trace = go.Scattergl if len(x) > threshold else go.Scatter
+    return trace(x=x, y=y, **kwargs)
+
+
+def line_trace(x, y, budget=POINT_BUDGET, threshold=WEBGL_THRESHOLD, **kwargs):
+    x, y = downsample(x, y, budget)
+    return scatter_trace(x, y, threshold=threshold, **kwargs)
+
+
+def scatter_render_mode(df, threshold=WEBGL_THRESHOLD):
+    # render_mode for plotly.express scatter/line charts.
+    return "webgl" if len(df) > threshold else "svg"
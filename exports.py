@@ -0,0 +1,52 @@
+import io
+import os
+import zlib
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from instrumentation import timed
+
+# Download payloads for the View Data sections, built only when a download is asked for. Rows are
+# encoded a chunk at a time, so a large export never holds a second full-size copy of the frame as
+# one CSV string, and iter_export() can feed a streaming response directly.
+FORMATS = {  # label: (file extension, MIME type)
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+CHUNK_ROWS = int(os.environ.get("DASHBOARD_EXPORT_CHUNK_ROWS", "50000"))
+
+
+def iter_csv(df, index=False, chunk_rows=CHUNK_ROWS):
+    # UTF-8 CSV, chunk_rows rows at a time; the header comes with the first chunk.
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=index, header=start == 0).encode("utf-8")
+
+
+def iter_export(df, export_format, index=False, chunk_rows=CHUNK_ROWS):
+    """Yield the bytes of df exported as export_format (a FORMATS label), piece by piece."""
+    if export_format == "CSV":
+        yield from iter_csv(df, index, chunk_rows)
+    elif export_format == "CSV (gzip)":
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)  # gzip container
+        for chunk in iter_csv(df, index, chunk_rows):
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    elif export_format == "Parquet":
+        # Parquet's footer comes last, so the file is only complete at the end; rows go in one group per chunk.
+        table = pa.Table.from_pandas(df, preserve_index=index)
+        sink = io.BytesIO()
+        with pq.ParquetWriter(sink, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=chunk_rows):
+                writer.write_batch(batch)
+        yield sink.getvalue()
+    else:
+        raise ValueError("unknown export format %r" % (export_format,))
+
+
+@timed("export.build")
+def export(df, export_format, index=False):
+    return b"".join(iter_export(df, export_format, index))
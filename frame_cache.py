@@ -0,0 +1,27 @@
+import os
+
+import numpy as np
+
+# Limits for the dashboard's in-process caches (shared by every user session).
+CACHE_TTL = int(os.environ.get("DASHBOARD_CACHE_TTL", "3600"))  # seconds
+VERSION_TTL = int(os.environ.get("DASHBOARD_VERSION_TTL", "300"))  # how often to re-ask CKAN for changes
+FRAME_CACHE_ENTRIES = int(os.environ.get("DASHBOARD_FRAME_CACHE_ENTRIES", "4"))
+FILTER_CACHE_ENTRIES = int(os.environ.get("DASHBOARD_FILTER_CACHE_ENTRIES", "256"))
+
+
+def file_version(path):
+    stat = os.stat(path)
+    return "%d-%d" % (stat.st_mtime_ns, stat.st_size)
+
+
+def freeze_frame(df):
+    # Mark the frame's backing arrays read-only so a frame shared between sessions
+    # can't be modified in place; callers needing to write must copy() first.
+    # Object (string) blocks are left alone: pandas' Cython string kernels reject read-only buffers.
+    for block in df._mgr.blocks:
+        values = block.values
+        if not isinstance(values, np.ndarray):
+            values = getattr(values, "_ndarray", None)
+        if isinstance(values, np.ndarray) and values.dtype != object:
+            values.flags.writeable = False
+    return df
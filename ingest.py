@@ -0,0 +1,54 @@
+"""Build a columnar snapshot of every dataset the dashboards read.
+
+Downloads the two CKAN packages, reads the two LTC CSV files, applies the typed
+schemas and normalization, and writes the result as a new snapshot version:
+
+    python ingest.py [--snapshot-dir snapshots] [--force-refresh]
+"""
+import argparse
+import logging
+import time
+
+import schemas
+import snapshot
+from ckan_data import COVID_CASES_DATASET, OUTBREAK_CAREHOME_DATASET, get_datasets
+
+LTC_FILES = {
+    "ltc_summary": ("covidsummary.csv", schemas.LTC_SUMMARY_SCHEMA),
+    "ltc_vaccination": ("ltc_immunization_data.csv", schemas.LTC_VACCINATION_SCHEMA),
+}
+
+
+def load_ltc_file(name):
+    path, schema = LTC_FILES[name]
+    return schemas.read_csv(path, schema)
+
+
+def load_sources(force_refresh=False):
+    df_covid_cases, df_outbreaks = get_datasets(COVID_CASES_DATASET, OUTBREAK_CAREHOME_DATASET,
+                                                force_refresh=force_refresh)
+    frames = {"covid_cases": df_covid_cases, "outbreaks": df_outbreaks}
+    for name in LTC_FILES:
+        frames[name] = load_ltc_file(name)
+    return frames
+
+
+def build_snapshot(root=snapshot.SNAPSHOT_DIR, force_refresh=False, sources=None, make_current=True):
+    return snapshot.write_snapshot(load_sources(force_refresh=force_refresh), root=root, sources=sources,
+                                   make_current=make_current)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--snapshot-dir", default=snapshot.SNAPSHOT_DIR, help="where snapshot versions are kept")
+    parser.add_argument("--force-refresh", action="store_true", help="ignore the local CKAN download cache")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    start = time.perf_counter()
+    version = build_snapshot(args.snapshot_dir, force_refresh=args.force_refresh)
+    print("snapshot %s written to %s in %.1fs" % (version, args.snapshot_dir, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
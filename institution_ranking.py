@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+RANK_COLUMNS = ["Institution Name", "total outbreaks"]
+
+
+def top_k(counts, labels, k):
+    """The k largest counts as a ranking frame, ties broken by name, using partial selection.
+
+    Only the k winners (and any ties for the last place) are sorted; the rest is one O(n) partition.
+    """
+    counts = np.asarray(counts)
+    n = len(counts)
+    if k < n:
+        kth = np.partition(counts, n - k)[n - k]
+        above = np.flatnonzero(counts > kth)
+        ties = np.flatnonzero(counts == kth)
+        if len(ties) > k - len(above):
+            ties = ties[np.argsort([str(labels[i]) for i in ties], kind="stable")[:k - len(above)]]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(n)
+    candidates = candidates[counts[candidates] > 0]
+    names = np.array([str(labels[i]) for i in candidates], dtype=object)
+    order = np.lexsort((names, -counts[candidates]))
+    return pd.DataFrame({RANK_COLUMNS[0]: names[order], RANK_COLUMNS[1]: counts[candidates][order]})
+
+
+def top_k_in_cube(cube_slice, k, count_column="Number of Outbreaks"):
+    # Ranking within a filter, from a slice of the outbreak cube: one weighted bincount over institution codes.
+    institutions = cube_slice["Institution Name"]
+    codes = institutions.cat.codes.to_numpy()
+    # Outbreaks without an institution name have code -1 (the cube keeps NaN groups); they are not ranked.
+    named = codes >= 0
+    counts = np.bincount(codes[named], weights=cube_slice[count_column].to_numpy()[named],
+                         minlength=len(institutions.cat.categories)).astype(np.int64)
+    return top_k(counts, institutions.cat.categories, k)
+
+
+class InstitutionRanking:
+    """Outbreak counts per institution, maintained incrementally as outbreak rows are synced.
+
+    sync() is given the whole outbreak frame each time. Rows past those already counted are
+    added to the counts; when the frame no longer starts with the rows counted before (a full
+    re-download, a shrunk table, rewritten rows) the counts are rebuilt from scratch.
+    """
+
+    def __init__(self):
+        self.labels = []
+        self.positions = {}
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.rows = 0
+        self.last_row = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _row_key(df, position):
+        row = df.iloc[position]
+        return tuple(str(row[column]) for column in ("_id", "Institution Name", "Date Outbreak Began")
+                     if column in df.columns)
+
+    def _add(self, institutions):
+        codes, uniques = pd.factorize(institutions, use_na_sentinel=True)
+        added = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        targets = np.empty(len(uniques), dtype=np.intp)
+        for i, label in enumerate(uniques):
+            position = self.positions.get(label)
+            if position is None:
+                position = self.positions[label] = len(self.labels)
+                self.labels.append(label)
+            targets[i] = position
+        if len(self.labels) > len(self.counts):
+            self.counts = np.concatenate([self.counts, np.zeros(len(self.labels) - len(self.counts), np.int64)])
+        self.counts[targets] += added
+
+    def _reset(self):
+        self.labels, self.positions = [], {}
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.rows, self.last_row = 0, None
+
+    @timed("ranking.sync")
+    def sync(self, df):
+        """Bring the counts up to date with df; returns the number of rows newly counted."""
+        with self.lock:
+            if self.rows and (len(df) < self.rows or self._row_key(df, self.rows - 1) != self.last_row):
+                self._reset()
+            new_rows = df["Institution Name"].iloc[self.rows:]
+            if len(new_rows):
+                self._add(new_rows.astype(object).to_numpy())
+                self.rows = len(df)
+                self.last_row = self._row_key(df, self.rows - 1)
+            return len(new_rows)
+
+    @timed("ranking.top")
+    def top(self, k=20):
+        with self.lock:
+            return top_k(self.counts, self.labels, k)
@@ -0,0 +1,187 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Timing (and optionally allocation) spans around each dashboard stage. Spans are only
+# recorded inside a run -- one Streamlit rerun or one Dash callback -- and a run only
+# records when profiling is switched on, so with it off a span costs one context lookup.
+#   DASHBOARD_PROFILE=time     record wall time per span
+#   DASHBOARD_PROFILE=memory   also record peak traced allocation per span (tracemalloc; slow)
+#   DASHBOARD_METRICS_FILE     append one JSON line per finished run to this file
+PROFILE = os.environ.get("DASHBOARD_PROFILE", "").lower()
+METRICS_FILE = os.environ.get("DASHBOARD_METRICS_FILE")
+
+logger = logging.getLogger(__name__)
+
+_current_run = contextvars.ContextVar("dashboard_run", default=None)
+_NOOP = nullcontext()
+_metrics_lock = threading.Lock()
+
+
+class Run:
+    """Spans recorded during one rerun or callback, in the order they started."""
+
+    def __init__(self, name, trace_memory=False):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.spans = []
+        self.start = time.perf_counter()
+        self.seconds = None
+        self._local = threading.local()
+        self._main_stack = self.stack()
+
+    def stack(self):
+        # Open spans of the calling thread; worker threads nest under whatever the run's thread has open.
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def fold_peak(self):
+        # tracemalloc keeps a single peak; fold it into every open span before it is reset.
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in self._main_stack:
+            if "_peak" in record:
+                record["_peak"] = max(record["_peak"], peak)
+        tracemalloc.reset_peak()
+
+    def summary(self):
+        return {"run": self.name, "time": time.time(), "ms": round(self.seconds * 1000, 2),
+                "spans": [{k: v for k, v in record.items() if not k.startswith("_")} for record in self.spans]}
+
+
+class Span:
+
+    def __init__(self, run, name, fields):
+        self.run = run
+        self.record = dict(fields, name=name)
+
+    def __enter__(self):
+        run, record = self.run, self.record
+        stack = run.stack()
+        main = stack is run._main_stack
+        record["depth"] = stack[-1]["depth"] + 1 if stack else (0 if main else len(run._main_stack))
+        if not main:
+            record["thread"] = threading.current_thread().name
+        # Memory is only attributed in the run's own thread; tracemalloc is process-wide.
+        self.track_memory = run.trace_memory and main and tracemalloc.is_tracing()
+        if self.track_memory:
+            run.fold_peak()
+            record["_base"] = record["_peak"] = tracemalloc.get_traced_memory()[0]
+        stack.append(record)
+        run.spans.append(record)
+        self.start = time.perf_counter()
+        record["start_ms"] = round((self.start - run.start) * 1000, 2)
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        record = self.record
+        record["ms"] = round(elapsed * 1000, 2)
+        if self.track_memory:
+            self.run.fold_peak()
+            record["peak_mb"] = round((record["_peak"] - record["_base"]) / 2 ** 20, 2)
+        stack = self.run.stack()
+        if stack and stack[-1] is record:
+            stack.pop()
+        return False
+
+
+def span(name, **fields):
+    """Context manager timing one stage of the current run; a no-op outside a recording run."""
+    run = _current_run.get()
+    if run is None:
+        return _NOOP
+    return Span(run, name, fields)
+
+
+def timed(name):
+    # Decorator form of span() for functions that are a stage on their own.
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current_run.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def begin_run(name, enabled=None, trace_memory=None):
+    """Start recording a run in the current context; returns the Run, or None when profiling is off."""
+    if enabled is None:
+        enabled = bool(PROFILE)
+    if not enabled:
+        _current_run.set(None)
+        return None
+    if trace_memory is None:
+        trace_memory = PROFILE == "memory"
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    run = Run(name, trace_memory=trace_memory)
+    _current_run.set(run)
+    return run
+
+
+def end_run(run):
+    """Stop recording run, log its breakdown and append it to the metrics file."""
+    if run is None:
+        return None
+    if _current_run.get() is run:
+        _current_run.set(None)
+    run.seconds = time.perf_counter() - run.start
+    summary = run.summary()
+    logger.info("%s", json.dumps(summary))
+    if METRICS_FILE:
+        with _metrics_lock, open(METRICS_FILE, "a") as f:
+            f.write(json.dumps(summary) + "\n")
+    return summary
+
+
+@contextmanager
+def recording(name, enabled=None, trace_memory=None):
+    """begin_run/end_run around a block, restoring whatever run was current before it."""
+    token = _current_run.set(None)
+    run = begin_run(name, enabled, trace_memory)
+    try:
+        yield run
+    finally:
+        end_run(run)
+        _current_run.reset(token)
+
+
+def propagate(fn):
+    """Wrap fn to run in a copy of the caller's context, so spans in worker threads join the caller's run."""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+
+def breakdown(summary):
+    """Rows for a timings table: one per span, indented by nesting."""
+    rows = []
+    for record in summary["spans"]:
+        row = {"stage": "\u00b7 " * record["depth"] + record["name"], "ms": record.get("ms")}
+        if "peak_mb" in record:
+            row["peak MB"] = record["peak_mb"]
+        details = ", ".join("%s=%s" % (k, v) for k, v in record.items()
+                            if k not in ("name", "depth", "start_ms", "ms", "peak_mb"))
+        if details:
+            row["details"] = details
+        rows.append(row)
+    return rows
+
+
+def server_timing(summary):
+    """Server-Timing header value (shown by browser dev tools) for a finished run."""
+    entries = ["%s;dur=%s" % (re.sub(r"[^A-Za-z0-9_.-]", "_", record["name"]), record.get("ms", 0))
+               for record in summary["spans"]]
+    entries.append("total;dur=%s" % summary["ms"])
+    return ", ".join(entries)
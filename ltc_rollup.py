@@ -0,0 +1,47 @@
+import pandas as pd
+
+from instrumentation import timed
+
+# Period rollups of the LTC COVID-19 summary for the time-series section. The daily reports are
+# reduced once to per-day sums and counts; a week, month or quarter rollup is then a single
+# groupby over that small table, and averages come out as sum / count per period.
+PERIODS = {"Week": "W", "Month": "M", "Quarter": "Q"}
+LABEL_FORMATS = {"W": "%Y-%m-%d", "M": "%Y %b", "Q": "%Y Q%q"}
+
+ACTIVE_OUTBREAKS = "LTC_Homes_with_Active_Outbreak"
+RESIDENT_DEATHS = "Resident Deaths"
+AVERAGE_HCW_CASES = "Average Health Worker Cases"
+AVERAGE_RESIDENT_CASES = "Average Resident Cases"
+
+
+@timed("ltc.daily")
+def daily_totals(df):
+    """Per report date: active outbreaks, new resident deaths, and sums/counts of active cases."""
+    df = df.sort_values("Report Date", kind="stable")
+    # Deaths are reported as a running total; the change since the previous report is that day's deaths.
+    deaths = df["Total_LTC_Resident_Deaths"].astype("float64").diff()
+    hcw = df["Confirmed_Active_LTC_HCW_Cases"].astype("float64")
+    residents = df["Confirmed_Active_LTC_Resident_Cases"].astype("float64")
+    daily = pd.DataFrame({"active": df[ACTIVE_OUTBREAKS].astype("int64"), "deaths": deaths,
+                          "hcw_sum": hcw, "hcw_count": hcw.notna().astype("int64"),
+                          "resident_sum": residents, "resident_count": residents.notna().astype("int64")})
+    daily.index = pd.DatetimeIndex(df["Report Date"])
+    return daily.groupby(level=0).sum()
+
+
+@timed("ltc.rollup")
+def rollup(daily, period="Month"):
+    """One chronologically ordered row per period, labelled for display in the "Period" column."""
+    freq = PERIODS[period]
+    totals = daily.groupby(daily.index.to_period(freq)).sum()
+    if freq == "W":
+        labels = totals.index.start_time.strftime(LABEL_FORMATS[freq])
+    else:
+        labels = totals.index.strftime(LABEL_FORMATS[freq])
+    return pd.DataFrame({
+        "Period": labels,
+        ACTIVE_OUTBREAKS: totals["active"].to_numpy(),
+        RESIDENT_DEATHS: totals["deaths"].to_numpy(),
+        AVERAGE_HCW_CASES: (totals["hcw_sum"] / totals["hcw_count"]).to_numpy(),
+        AVERAGE_RESIDENT_CASES: (totals["resident_sum"] / totals["resident_count"]).to_numpy(),
+    })
@@ -0,0 +1,59 @@
+import pandas as pd
+
+from instrumentation import timed
+
+# Staff vaccination rates of LTC homes, reported per home about once a month. Homes are reduced to
+# per-date, per-area sums and counts first, and the daily LTC summary is then joined to the nearest
+# report date, so the join has one row per summary day instead of one per summary day and home.
+# The file has no staff headcounts, so "weighted" rates weight each area by its reporting homes;
+# "mean" rates give every area the same weight.
+DOSES = {"1st Dose": "1st_dose_percentage_staff_vaccination_rate",
+         "2nd Dose": "2nd_dose_percentage_staff_vaccination_rate"}
+AREAS = ["PHU", "City"]
+LOW_COVERAGE = 0.9
+VACCINATION_DATE = "Vaccination Report Date"
+HOMES_REPORTING = "Homes Reporting"
+# Reports are monthly: a summary day takes the nearest report within half a month, or none.
+MATCH_WITHIN = pd.Timedelta(days=16)
+
+
+@timed("vaccination.area_totals")
+def area_totals(df, area="PHU", threshold=LOW_COVERAGE):
+    """Per report date and area: homes reporting and, per dose, the rate sum, rate count and homes below threshold."""
+    frame = pd.DataFrame({"Report Date": df["Report Date"], area: df[area], "homes": 1})
+    for dose, column in DOSES.items():
+        rates = df[column].astype("float64")
+        frame[dose + " sum"] = rates
+        frame[dose + " count"] = rates.notna().astype("int64")
+        frame[dose + " below"] = (rates < threshold).astype("int64")
+    return frame.groupby(["Report Date", area], observed=True, sort=True).sum()
+
+
+@timed("vaccination.date_rates")
+def date_rates(totals):
+    """One row per report date: homes reporting, mean and weighted rate per dose, and homes below the threshold."""
+    by_date = totals.groupby(level="Report Date")
+    rates = {HOMES_REPORTING: by_date["homes"].sum()}
+    for dose in DOSES:
+        area_rates = totals[dose + " sum"] / totals[dose + " count"]
+        rates["Mean %s Staff Rate" % dose] = area_rates.groupby(level="Report Date").mean()
+        rates["Weighted %s Staff Rate" % dose] = by_date[dose + " sum"].sum() / by_date[dose + " count"].sum()
+        rates["Homes Below Threshold (%s)" % dose] = by_date[dose + " below"].sum()
+    return pd.DataFrame(rates).round(3)
+
+
+def area_rates(totals):
+    # Per report date and area, for views that break the rates down by PHU or City.
+    rates = {HOMES_REPORTING: totals["homes"]}
+    for dose in DOSES:
+        rates["%s Staff Rate" % dose] = (totals[dose + " sum"] / totals[dose + " count"]).round(3)
+        rates["Homes Below Threshold (%s)" % dose] = totals[dose + " below"]
+    return pd.DataFrame(rates).reset_index()
+
+
+@timed("vaccination.join")
+def join_summary(summary, rates, within=MATCH_WITHIN):
+    """The LTC summary, one row per report date, with the rates of the nearest vaccination report date."""
+    rates = rates.rename_axis(VACCINATION_DATE).reset_index()
+    return pd.merge_asof(summary.sort_values("Report Date"), rates, left_on="Report Date",
+                         right_on=VACCINATION_DATE, direction="nearest", tolerance=within)
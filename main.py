@@ -1,26 +1,63 @@
+from functools import lru_cache
+
 import dash
-import dcc as dcc
-from dash import dcc, html
-from flask import Flask
+from dash import Patch, dcc, html
+from dash.exceptions import PreventUpdate
+from flask import Flask, g, request
 import dash_bootstrap_components as dbc
+import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
-import plotly.express as px
-from dash.dependencies import Input, Output
-from jupyter_dash import JupyterDash
+from dash.dependencies import Input, Output, State
 
-# Load data from the CSV file
-df = pd.read_csv('ob_report_2023.csv')
+import instrumentation
+import schemas
+import snapshot
+from downsample import downsample, line_trace
+from frame_cache import file_version
+from instrumentation import span
+from shared_data import ResultCache, shared_frame
 
 # Specify the date format
 date_format = '%m/%d/%y'
 
-# Convert date columns to datetime objects
-df['Date Outbreak Began'] = pd.to_datetime(df['Date Outbreak Began'], format=date_format)
-df['Date Declared Over'] = pd.to_datetime(df['Date Declared Over'], format=date_format)
+# Stage timings of the data load and initial figures, recorded when DASHBOARD_PROFILE is set.
+startup_run = instrumentation.begin_run("dash.startup")
+
+# CURRENT is read once: a publish landing mid-startup must not key one version's results on another's data.
+snapshot_version = snapshot.current_version()
+if snapshot_version:
+    # Memory-map the outbreaks dataset from the columnar snapshot written by ingest.py
+    data_version = snapshot.VERSION_PREFIX + snapshot_version
+    df = snapshot.open_dataset("outbreaks", snapshot_version)
+else:
+    # Load data from the CSV file, typed and with both date columns parsed using the report's date format.
+    # It is parsed once per file version and memory-mapped, so every worker process shares one copy.
+    data_version = "%s-%s" % (file_version('ob_report_2023.csv'), schemas.fingerprint())
+    df = shared_frame("outbreaks", data_version, lambda: schemas.read_csv('ob_report_2023.csv', dict(
+        schemas.OUTBREAKS_SCHEMA, dates={'Date Outbreak Began': date_format, 'Date Declared Over': date_format})))
+
+# Callback results shared by all worker processes, behind each process's own LRU cache.
+result_cache = ResultCache()
+
+# Dash 2.11+ runs inline in a notebook itself (jupyter_mode below), without jupyter-dash.
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+
+
+# With profiling on, each callback request is one run: its callback's spans plus Dash's own dispatch and
+# serialization, reported in the logs and as a Server-Timing header.
+@app.server.before_request
+def begin_request_profile():
+    if request.path.startswith("/_dash-update-component"):
+        g.profile_run = instrumentation.begin_run("dash.callback")
 
-# app = dash.Dash(__name__)
-app = JupyterDash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+
+@app.server.after_request
+def end_request_profile(response):
+    timings = instrumentation.end_run(g.pop("profile_run", None))
+    if timings:
+        response.headers["Server-Timing"] = instrumentation.server_timing(timings)
+    return response
 
 # Define the app layout
 
@@ -102,44 +139,156 @@ app.layout = dash.html.Div(
 )
 
 
+def filter_outbreaks(selected_settings, selected_causes, start_date, end_date):
+    mask = pd.Series(True, index=df.index)
+    if selected_settings:
+        mask &= df['Outbreak Setting'].isin(selected_settings)
+    if selected_causes:
+        mask &= df['Causative Agent-1'].isin(selected_causes)
+    if start_date:
+        mask &= df['Date Outbreak Began'] >= pd.Timestamp(start_date)
+    if end_date:
+        mask &= df['Date Outbreak Began'] <= pd.Timestamp(end_date)
+    return df.loc[mask]
+
+
+# Chart data per filter combination, aggregated server side so a callback's payload is bounded by the
+# number of dates, institutions and outbreak types rather than the number of outbreaks.
+@lru_cache(maxsize=256)
+@result_cache.memoize(data_version)
+def aggregate_outbreaks(selected_settings, selected_causes, start_date, end_date):
+    filtered_df = filter_outbreaks(selected_settings, selected_causes, start_date, end_date)
+
+    by_date = filtered_df.groupby('Date Outbreak Began').size()
+
+    active = filtered_df.loc[filtered_df['Active'] == 'Y', 'Institution Name'].value_counts()
+    active = active[active > 0]
+
+    by_type = filtered_df['Type of Outbreak'].value_counts()
+    by_type = by_type[by_type > 0]
+
+    return {
+        'dates': by_date.index.values, 'outbreaks': by_date.values,
+        'institutions': active.index.astype(str).tolist(), 'active': active.tolist(),
+        'types': by_type.index.astype(str).tolist(), 'type_counts': by_type.tolist(),
+    }
+
+
+def filter_key(selected_settings, selected_causes, start_date, end_date):
+    return (tuple(sorted(selected_settings or ())), tuple(sorted(selected_causes or ())), start_date or None,
+            end_date or None)
+
+
+def build_figures(data):
+    # Line Chart (line chart)
+    # Long histories are downsampled to a point budget (LTTB); zooming refetches full resolution.
+    line_fig = go.Figure(data=[line_trace(data['dates'], data['outbreaks'], mode='lines')])
+    line_fig.update_layout(title_text='Outbreaks Over Time', xaxis_title='Date Outbreak Began',
+                           yaxis_title='Number of Outbreaks')
+
+    # Column Chart (replacing bar chart)
+    column_fig = go.Figure(data=[go.Bar(x=data['institutions'], y=data['active'])])
+    column_fig.update_layout(title_text='Active Status Column Chart', xaxis_title='Institution Name',
+                             yaxis_title='Active Outbreaks',
+                             xaxis=dict(tickmode='array', tickvals=data['institutions'],
+                                        ticktext=[name[:15] for name in data['institutions']]))
+
+    # Pie Chart
+    pie_fig = go.Figure(data=[go.Pie(labels=data['types'], values=data['type_counts'])])
+    pie_fig.update_layout(title_text='Type of Outbreak Pie Chart')
+
+    # Adjust the size of the Pie Chart
+    pie_fig.update_layout(height=700, width=1000)  # You can adjust the height and width as needed
+
+    return line_fig, column_fig, pie_fig
+
+
+def patch_figures(data):
+    # Only the trace data (and the column chart's tick labels) change between filters,
+    # so the callback sends those fields instead of three complete figures.
+    line_patch = Patch()
+    line_patch['data'][0]['x'], line_patch['data'][0]['y'] = downsample(data['dates'], data['outbreaks'])
+    line_patch['layout']['xaxis']['autorange'] = True
+
+    column_patch = Patch()
+    column_patch['data'][0]['x'] = data['institutions']
+    column_patch['data'][0]['y'] = data['active']
+    column_patch['layout']['xaxis']['tickvals'] = data['institutions']
+    column_patch['layout']['xaxis']['ticktext'] = [name[:15] for name in data['institutions']]
+
+    pie_patch = Patch()
+    pie_patch['data'][0]['labels'] = data['types']
+    pie_patch['data'][0]['values'] = data['type_counts']
+
+    return line_patch, column_patch, pie_patch
+
+
+# Initial figures are rendered into the layout; the callback only patches them afterwards.
+line_fig, column_fig, pie_fig = build_figures(aggregate_outbreaks(*filter_key(
+    None, None, None, None)))
+app.layout['line-chart'].figure = line_fig
+app.layout['column-chart'].figure = column_fig
+app.layout['pie-chart'].figure = pie_fig
+instrumentation.end_run(startup_run)
+
+
 # Define callback functions to update graphs
 @app.callback(
     Output('line-chart', 'figure'),
     Output('column-chart', 'figure'),
     Output('pie-chart', 'figure'),
     Input('outbreak-setting-dropdown', 'value'),
+    Input('outbreak-cause-dropdown', 'value'),
     Input('date-range-picker', 'start_date'),
-    Input('date-range-picker', 'end_date')
+    Input('date-range-picker', 'end_date'),
+    prevent_initial_call=True,
 )
-def update_graphs(selected_settings, start_date, end_date):
-    filtered_df = df
+def update_graphs(selected_settings, selected_causes, start_date, end_date):
+    with span("dash.aggregate"):
+        data = aggregate_outbreaks(*filter_key(selected_settings, selected_causes, start_date, end_date))
+    with span("dash.patch"):
+        return patch_figures(data)
 
-    # Filter by selected Outbreak Settings
-    if selected_settings:
-        filtered_df = filtered_df[filtered_df['Outbreak Setting'].isin(selected_settings)]
 
-    # Update Line Chart (line chart)
-    line_fig = px.line(filtered_df, x=filtered_df['Date Outbreak Began'], y=filtered_df['Active'],
-                      title='Active Outbreaks Over Time')
-    
-    line_fig.update_layout(yaxis=dict(autorange="reversed"))
+def relayout_x_range(relayout_data):
+    if 'xaxis.range[0]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return None
 
 
-    # Update Column Chart (replacing bar chart)
-    column_fig = go.Figure(data=[
-        go.Bar(x=filtered_df['Institution Name'].str[:15], y=filtered_df['Active'])
-    ])
-    column_fig.update_layout(title_text='Active Status Column Chart', xaxis_title='Institution Name',
-                             yaxis_title='Active')
-
-    # Update Pie Chart
-    pie_fig = px.pie(filtered_df, names='Type of Outbreak', title='Type of Outbreak Pie Chart')
+# Zooming the line chart swaps in the full-resolution points of the visible window (downsampled again
+# only if the window itself is over budget); resetting the axes goes back to the overview.
+@app.callback(
+    Output('line-chart', 'figure', allow_duplicate=True),
+    Input('line-chart', 'relayoutData'),
+    State('outbreak-setting-dropdown', 'value'),
+    State('outbreak-cause-dropdown', 'value'),
+    State('date-range-picker', 'start_date'),
+    State('date-range-picker', 'end_date'),
+    prevent_initial_call=True,
+)
+def zoom_line_chart(relayout_data, selected_settings, selected_causes, start_date, end_date):
+    if not relayout_data:
+        raise PreventUpdate
+    x_range = relayout_x_range(relayout_data)
+    if x_range is None and not relayout_data.get('xaxis.autorange'):
+        raise PreventUpdate
 
-    # Adjust the size of the Pie Chart
-    pie_fig.update_layout(height=700, width=1000)  # You can adjust the height and width as needed
+    with span("dash.aggregate"):
+        data = aggregate_outbreaks(*filter_key(selected_settings, selected_causes, start_date, end_date))
+    dates, outbreaks = data['dates'], data['outbreaks']
+    if x_range is not None:
+        window = ((dates >= np.datetime64(pd.Timestamp(x_range[0]))) &
+                  (dates <= np.datetime64(pd.Timestamp(x_range[1]))))
+        dates, outbreaks = dates[window], outbreaks[window]
 
-    return line_fig, column_fig, pie_fig
+    with span("dash.downsample", points=len(dates)):
+        line_patch = Patch()
+        line_patch['data'][0]['x'], line_patch['data'][0]['y'] = downsample(dates, outbreaks)
+    return line_patch
 
 
 if __name__ == "__main__":
-    app.run_server(mode="inline")
+    app.run(jupyter_mode="inline")
@@ -1,18 +1,34 @@
-import io
 import dateutil
-import requests
+import functools
 import streamlit as st
-import plotly.express as px
 import pandas as pd
 import warnings
 import numpy as np
-import plotly.graph_objs as go
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 
+import exports
+import instrumentation
+import schemas
+import snapshot
+from ckan_data import COVID_CASES_DATASET, OUTBREAK_CAREHOME_DATASET, dataset_version, get_data, get_datasets
+from charts import (DEMOGRAPHIC_OPTIONS, TIME_SERIES_OPTIONS, active_outbreaks_figure, case_comparison_figure,
+                    causative_agent_bar_figure, covid_demographics_figure, outbreaks_by_institution_figure,
+                    outbreaks_line_figure, time_series_figure)
+from demographics import demographic_crosstabs
+from frame_cache import (CACHE_TTL, FILTER_CACHE_ENTRIES, FRAME_CACHE_ENTRIES, VERSION_TTL, file_version,
+                         freeze_frame)
+from ingest import LTC_FILES, build_snapshot, load_ltc_file
+from institution_ranking import InstitutionRanking, top_k_in_cube
+from instrumentation import span
+from ltc_rollup import ACTIVE_OUTBREAKS, PERIODS, daily_totals, rollup
+from ltc_vaccination import AREAS, HOMES_REPORTING, VACCINATION_DATE, area_rates, area_totals, date_rates, join_summary
+from outbreak_cube import COUNT, build_outbreak_cube, outbreaks_by_agent, outbreaks_by_date_and_type, outbreaks_by_type
+from outbreak_index import OutbreakIndex
+from outbreak_intervals import INTERVAL_GROUPS, OutbreakIntervals, day_range
+from refresher import REFRESH_INTERVAL, SnapshotRefresher
+
 today = date.today()
-COVID_CASES_DATASET = ["https://ckan0.cf.opendata.inter.prod-toronto.ca", {"id": "covid-19-cases-in-toronto"}]
-OUTBREAK_CAREHOME_DATASET = ["https://ckan0.cf.opendata.inter.prod-toronto.ca", {"id": "outbreaks-in-toronto"
-                                                                                       "-healthcare-institutions"}]
 
 warnings.filterwarnings('ignore')
 
@@ -23,49 +39,184 @@ st.info('This dashboard displays visualizations on outbreaks and Covid-19 data i
         'institutions.', icon="ℹ️")
 st.markdown('<style>div.block-container{padding-top:1rem;}</style>', unsafe_allow_html=True)
 
-def get_data(list_url_params):
-    url = list_url_params[0] + "/api/3/action/package_show"
-    package = requests.get(url, params=list_url_params[1]).json()
-    df_list = []
-    # To get resource data:
-    for idx, resource in enumerate(package["result"]["resources"]):
-
-        # for datastore_active resources:
-        if resource["datastore_active"]:
-            # To get all records in CSV format:
-            url = list_url_params[0] + "/datastore/dump/" + resource["id"]
-            resource_dump_data = requests.get(url).content
-            c = pd.read_csv(io.StringIO(resource_dump_data.decode('utf-8')))
-            if list_url_params[0] == OUTBREAK_CAREHOME_DATASET[0]:
-                c.rename(
-                    columns={"Causative Agent - 1": "Causative Agent-1", "Causative Agent - 2": "Causative Agent-2"},
-                    inplace=True)
-            df_list.append(c)
-    dfs = pd.concat(df_list, ignore_index=True)
-    return dfs
-
-
-df_covid_cases = get_data(COVID_CASES_DATASET)
-df_outbreaks_carehomes = get_data(OUTBREAK_CAREHOME_DATASET)
-df_LTC_covid_summary = pd.read_csv("covidsummary.csv", encoding="ISO-8859-1")
-df_LTC_vaccination_rates = pd.read_csv("ltc_immunization_data.csv", encoding="ISO-8859-1")
-
-df_LTC_covid_summary.rename(columns={df_LTC_covid_summary.columns[0]: "Report Date"}, inplace=True)
-df_LTC_vaccination_rates.rename(columns={df_LTC_vaccination_rates.columns[0]: "Report Date"}, inplace=True)
-df_outbreaks_carehomes = df_outbreaks_carehomes.replace({'LTCH': 'Long-Term Care Home'}, regex=True)
+# Stage timings for this rerun: always recorded with DASHBOARD_PROFILE set, or per session from the sidebar.
+show_timings = st.sidebar.checkbox("Show stage timings", help="Time each loading, filtering and chart stage of "
+                                                              "this page")
+profile_run = instrumentation.begin_run("dashboard", enabled=show_timings or None)
+
+
+# With DASHBOARD_REFRESH_INTERVAL set, a background thread polls CKAN and publishes new snapshots (see refresher.py),
+# so reruns never download or parse; only the very first start waits for the initial build.
+@st.cache_resource(show_spinner=False)
+def snapshot_refresher():
+    return SnapshotRefresher().start()
+
+
+# Prefer a pre-built columnar snapshot (see ingest.py); otherwise read CKAN and the CSV files directly.
+if REFRESH_INTERVAL:
+    refresher = snapshot_refresher()
+    with st.spinner("Preparing data..."):
+        snapshot_version = refresher.wait()
+    if snapshot_version is None:
+        st.error("The data could not be downloaded yet (%s). Retrying in the background." % refresher.error)
+        st.stop()
+else:
+    refresher = None
+    snapshot_version = snapshot.current_version()
+
+# Re-download every resource instead of serving the local snapshots.
+force_refresh = st.sidebar.button("Refresh data", help="Ignore the local cache and download the latest data")
+if force_refresh and refresher is not None:
+    # The new version re-keys every cached stage; clearing the caches would also drop the refresher.
+    snapshot_version = refresher.refresh(force_refresh=True)
+elif force_refresh:
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    if snapshot_version:
+        snapshot_version = build_snapshot(force_refresh=True)
+    else:
+        get_datasets(COVID_CASES_DATASET, OUTBREAK_CAREHOME_DATASET, force_refresh=True)
+if snapshot_version:
+    st.sidebar.caption("Data snapshot: %s" % snapshot_version)
+
+
+# Data snapshot versions; every cached stage below is keyed on these so a data change invalidates it.
+@st.cache_data(ttl=VERSION_TTL, show_spinner=False)
+def ckan_version(list_url_params):
+    return dataset_version(list_url_params)
+
+
+# Stages warm_snapshot() built ahead for a new snapshot, by (loader name, *arguments). Each loader marked @warmed
+# takes its stage from here on its first call for that version instead of building it again.
+@st.cache_resource(show_spinner=False)
+def warmed_stages():
+    return {}
+
+
+def warmed(loader):
+    @functools.wraps(loader)
+    def load(*args):
+        stage = warmed_stages().pop((loader.__name__,) + args, None)
+        return loader(*args) if stage is None else stage
+    return load
+
+
+# Loaded and normalized frames are shared by all sessions without copying, so they are frozen read-only.
+@st.cache_resource(ttl=CACHE_TTL, max_entries=FRAME_CACHE_ENTRIES)
+@warmed
+def load_snapshot_dataset(name, version):
+    return freeze_frame(snapshot.open_dataset(name, version[len(snapshot.VERSION_PREFIX):]))
+
+
+@st.cache_resource(show_spinner=False)
+def background_loader():
+    # Loads that run while the page renders; shared by every session for the life of the server.
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="dashboard-load")
+
+
+def read_covid_cases(covid_version):
+    # Runs on the background loader, outside the script thread, so it reads without Streamlit's caches.
+    if snapshot.is_snapshot_version(covid_version):
+        return freeze_frame(snapshot.open_dataset("covid_cases", covid_version[len(snapshot.VERSION_PREFIX):]))
+    return freeze_frame(get_data(COVID_CASES_DATASET))
+
+
+# The COVID case dump is by far the largest dataset and only the demographics chart at the bottom of the page
+# uses it, so its load starts in the background as soon as its version is known and is only waited on there.
+@st.cache_resource(ttl=CACHE_TTL, max_entries=FRAME_CACHE_ENTRIES, show_spinner=False)
+def covid_cases_load(covid_version):
+    return background_loader().submit(read_covid_cases, covid_version)
 
-col1, col2 = st.columns(2)
-df_LTC_covid_summary["Report Date"] = pd.to_datetime(df_LTC_covid_summary["Report Date"])
-df_LTC_vaccination_rates["Report Date"] = pd.to_datetime(df_LTC_vaccination_rates["Report Date"])
-df_merged = df_LTC_covid_summary.merge(df_LTC_vaccination_rates, on='Report Date', how='left')
 
-df_outbreaks_carehomes["Date Outbreak Began"] = pd.to_datetime(
-    df_outbreaks_carehomes["Date Outbreak Began"])
+def load_covid_cases(covid_version):
+    load = covid_cases_load(covid_version)
+    try:
+        return load.result()
+    except Exception:
+        # Don't keep handing out a failed load; the next rerun starts a new one.
+        covid_cases_load.clear()
+        raise
 
-filtered_df = df_outbreaks_carehomes
+
+@st.cache_resource(ttl=CACHE_TTL, max_entries=FRAME_CACHE_ENTRIES)
+def load_outbreaks(outbreak_version):
+    if snapshot.is_snapshot_version(outbreak_version):
+        return load_snapshot_dataset("outbreaks", outbreak_version)
+    return freeze_frame(get_data(OUTBREAK_CAREHOME_DATASET))
+
+
+@st.cache_resource(ttl=CACHE_TTL, max_entries=FRAME_CACHE_ENTRIES)
+def load_ltc(name, version):
+    if snapshot.is_snapshot_version(version):
+        return load_snapshot_dataset(name, version)
+    return freeze_frame(load_ltc_file(name))
+
+
+with span("data.versions"):
+    if snapshot_version:
+        covid_version = outbreak_version = summary_version = vaccination_version = (
+                snapshot.VERSION_PREFIX + snapshot_version)
+    else:
+        covid_version = ckan_version(COVID_CASES_DATASET)
+        outbreak_version = ckan_version(OUTBREAK_CAREHOME_DATASET)
+        summary_version = file_version(LTC_FILES["ltc_summary"][0])
+        vaccination_version = file_version(LTC_FILES["ltc_vaccination"][0])
+
+# Each section below loads only its own dataset, right before it is drawn; the COVID cases start now.
+covid_cases_load(covid_version)
+
+with span("data.load_outbreaks"), st.spinner("Loading outbreak data..."):
+    df_outbreaks_carehomes = load_outbreaks(outbreak_version)
+
+
+# Outbreak rows sorted by date with posting lists per setting and institution, built once per snapshot.
+@st.cache_resource(ttl=CACHE_TTL, max_entries=FRAME_CACHE_ENTRIES)
+@warmed
+def load_outbreak_index(outbreak_version):
+    return OutbreakIndex(load_outbreaks(outbreak_version))
+
+
+# Outbreak counts pre-aggregated once per snapshot; the outbreak charts only ever slice and sum this.
+@st.cache_resource(ttl=CACHE_TTL, max_entries=FRAME_CACHE_ENTRIES)
+@warmed
+def load_outbreak_cube(outbreak_version):
+    return OutbreakIndex(build_outbreak_cube(load_outbreaks(outbreak_version)))
+
+
+# Filtered frames and their aggregates are small, so they are cached per (snapshot, filter state).
+@st.cache_data(ttl=CACHE_TTL, max_entries=FILTER_CACHE_ENTRIES, show_spinner=False)
+def filter_outbreaks(outbreak_version, date1, date2, setting=None, institutions=()):
+    if setting == "--- View All ---":
+        setting = None
+    return load_outbreak_index(outbreak_version).lookup(date1, date2, setting, institutions)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=FILTER_CACHE_ENTRIES, show_spinner=False)
+def filter_outbreak_cube(outbreak_version, date1, date2, setting=None, institutions=()):
+    if setting == "--- View All ---":
+        setting = None
+    return load_outbreak_cube(outbreak_version).lookup(date1, date2, setting, institutions)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=FILTER_CACHE_ENTRIES, show_spinner=False)
+def outbreak_view_data(outbreak_version, date1, date2, setting, institutions):
+    cube_slice = filter_outbreak_cube(outbreak_version, date1, date2, setting, institutions)
+    # Layout for Outbreak Type view data.
+    outbreak_type_df = outbreaks_by_type(cube_slice)
+
+    # Layout for Causative Agent view data.
+    causative_agent_df = outbreaks_by_agent(cube_slice)
+
+    # Outbreaks per date for each outbreak type, for the line chart.
+    outbreak_type_by_date_df = outbreaks_by_date_and_type(cube_slice)
+    return (schemas.plain_labels(outbreak_type_df), schemas.plain_labels(causative_agent_df),
+            outbreak_type_by_date_df)
+
+
+col1, col2 = st.columns(2)
 
 # Setting default start date to 2 months before most current date in dataset
-endDateCarehomeData = pd.to_datetime(df_outbreaks_carehomes["Date Outbreak Began"]).max()
+endDateCarehomeData = df_outbreaks_carehomes["Date Outbreak Began"].max()
 startDateCarehomeData = endDateCarehomeData - dateutil.relativedelta.relativedelta(months=2)
 with col1:
     date1 = pd.to_datetime(st.date_input("Start Date", startDateCarehomeData))
@@ -73,112 +224,65 @@ with col1:
 with col2:
     date2 = pd.to_datetime(st.date_input("End Date", endDateCarehomeData))
 
-mask = (filtered_df['Date Outbreak Began'] > date1) & (filtered_df['Date Outbreak Began'] <= date2)
-df_filtered_by_date = filtered_df.loc[mask]
+with span("outbreaks.filter_options"):
+    cube_filtered_by_date = filter_outbreak_cube(outbreak_version, date1, date2)
 
 st.sidebar.header("Choose your filter: ")
 # Create for Outbreak Setting
 outbreak_setting = st.sidebar.radio("Select by Setting",
-                                    np.append("--- View All ---", df_filtered_by_date["Outbreak Setting"].unique()),
+                                    np.append("--- View All ---", cube_filtered_by_date["Outbreak Setting"].unique()),
                                     index=0,
                                     )
-if not outbreak_setting or outbreak_setting == "--- View All ---":
-    df_filtered_by_date = df_filtered_by_date.copy()
-else:
-    df_filtered_by_date = df_filtered_by_date[df_filtered_by_date["Outbreak Setting"] == outbreak_setting]
+with span("outbreaks.filter_options"):
+    cube_filtered_by_date = filter_outbreak_cube(outbreak_version, date1, date2, outbreak_setting)
 
 # Create for Institution Setting
-institution_setting = st.sidebar.multiselect("Select by Location", df_filtered_by_date["Institution Name"].unique())
-if not institution_setting:
-    df_filtered_by_date = df_filtered_by_date.copy()
-else:
-    df_filtered_by_date = df_filtered_by_date[df_filtered_by_date["Institution Name"].isin(institution_setting)]
+institution_setting = st.sidebar.multiselect("Select by Location",
+                                             cube_filtered_by_date["Institution Name"].unique())
+institution_setting = tuple(institution_setting)
+
+with span("outbreaks.view_data"):
+    OutbreakType_ViewData_df, CausativeAgent_ViewData_df, df_outbreak_type_by_date = outbreak_view_data(
+        outbreak_version, date1, date2, outbreak_setting, institution_setting)
+
+
+def plot_chart(name, fig, **kwargs):
+    # Figures are serialized inside st.plotly_chart, so that cost shows up as the chart's render span.
+    with span("chart.%s.render" % name):
+        st.plotly_chart(fig, **kwargs)
 
-if not outbreak_setting and not institution_setting:
-    df_filtered_by_date = df_filtered_by_date.copy()
-elif outbreak_setting and institution_setting:
-    df_filtered_by_date = df_filtered_by_date[
-        (df_filtered_by_date["Outbreak Setting"] == outbreak_setting) & df_filtered_by_date["Institution Name"].isin(
-            institution_setting)]
 
-# Layout for Outbreak Type view data.
-OutbreakType_ViewData_df = df_filtered_by_date.groupby(by=["Type of Outbreak"], as_index=False)[
-    ['Type of Outbreak']].size().rename(columns={'size': 'Number of Outbreaks'})
+# Download payloads are only built once a download is asked for, then cached per (snapshot, filter, format) so
+# repeating it is free. key identifies the data (snapshot and filter); load returns the frame to export.
+@st.cache_data(ttl=CACHE_TTL, max_entries=FILTER_CACHE_ENTRIES, show_spinner=False)
+def export_payload(key, export_format, index, _load):
+    return exports.export(_load(), export_format, index=index)
 
-# Layout for Causative Agent view data.
-CausativeAgent_ViewData_df = df_filtered_by_date.groupby('Type of Outbreak')[
-    'Causative Agent-1'].value_counts().reset_index(
-    name='Number of Outbreaks')
+
+def download_data(name, key, load, file_name, label="Download Data", index=False):
+    export_format = st.selectbox("Format", list(exports.FORMATS), key=name + "_export_format")
+    requested = (key, export_format)
+    if st.button("Prepare download", key=name + "_export_prepare"):
+        st.session_state[name + "_export"] = requested
+    # Stays ready for later reruns until the data or the format changes.
+    if st.session_state.get(name + "_export") == requested:
+        extension, mime = exports.FORMATS[export_format]
+        with span("export.%s" % name, format=export_format), st.spinner("Preparing download..."):
+            payload = export_payload(key, export_format, index, load)
+        st.download_button(label, data=payload, file_name="%s.%s" % (file_name, extension), mime=mime,
+                           key=name + "_export_download", help='Click here to download the data')
 
 
 def create_outbreaks_line_graph():
     st.subheader("Outbreaks Over Time")
-    df_filtered_by_date['outbreak_count'] = df_filtered_by_date.groupby('Date Outbreak Began')[
-        'Date Outbreak Began'].transform('count')
-
-    df_outbreak_type_by_date = pd.pivot_table(df_filtered_by_date, values='outbreak_count',
-                                              index=['Date Outbreak Began'],
-                                              columns='Type of Outbreak')
-    fig1 = px.line()
-    for col in df_outbreak_type_by_date.columns:
-        fig1.add_trace(go.Scatter(x=df_outbreak_type_by_date.index, y=df_outbreak_type_by_date[col].values,
-                                  name=col,
-                                  line=dict(shape='linear'),
-                                  connectgaps=True,
-                                  ))
-
-    fig1['layout'].update(
-        yaxis=dict(title="Number of Outbreaks", titlefont=dict(size=19)),
-        margin=dict(l=10, r=10, t=30, b=20),
-        hoverlabel=dict(
-            bgcolor="white",
-            font_color="black",
-            font_size=15,
-        ))
-    fig1.update_traces(
-        hovertemplate="<br>".join([
-            "%{x}<br>" +
-            "Number of Outbreaks: %{y}<extra></extra>"
-        ]))
-
-    st.plotly_chart(fig1, use_container_width=True, height=200)
+    fig1 = outbreaks_line_figure(df_outbreak_type_by_date)
+    plot_chart("outbreaks_line", fig1, use_container_width=True, height=200)
 
 
 def create_causative_agent_bar_graph():
     st.subheader("Causative Agent Per Outbreak Type")
-
-    g = df_filtered_by_date.groupby('Type of Outbreak')['Causative Agent-1'].value_counts().reset_index(
-        name='Number of Outbreaks')
-    g['Percentage of Total Outbreaks'] = (g['Number of Outbreaks'] / g['Number of Outbreaks'].sum()) * 100
-
-    fig2 = px.bar(g, x='Type of Outbreak', y='Number of Outbreaks', color="Causative Agent-1",
-                  hover_name="Causative Agent-1",
-                  hover_data={'Percentage of Total Outbreaks': ':.2f',
-                              'Type of Outbreak': False,  # remove Type of Outbreak from hover data
-                              'Causative Agent-1': False,
-                              },
-                  custom_data=['Percentage of Total Outbreaks', 'Causative Agent-1']
-                  )
-    fig2.update_traces(
-        hovertemplate="<br>".join([
-            "<b>%{customdata[1]}</b><br><br>"
-            "Number of Outbreaks: %{y}<br>"
-            "Percentage of Total Outbreaks: %{customdata[0]:.2f}% <extra></extra>",
-        ])
-    )
-
-    fig2['layout'].update(
-        xaxis={'categoryorder': 'total descending'},
-        yaxis=dict(title="Total Outbreaks", titlefont=dict(size=19)),
-        margin=dict(l=20, r=20, t=30, b=20),
-        hoverlabel=dict(
-            bgcolor="white",
-            font_color="black",
-            font_size=15,
-        )
-
-    )
-    st.plotly_chart(fig2, use_container_width=True)
+    fig2 = causative_agent_bar_figure(CausativeAgent_ViewData_df)
+    plot_chart("causative_agent_bar", fig2, use_container_width=True)
 
 
 with col1:
@@ -195,184 +299,165 @@ cl1, cl2 = st.columns(2)
 with cl1:
     with st.expander("View Data (Outbreaks by Type)"):
         st.write(OutbreakType_ViewData_df.style.background_gradient(cmap="Blues"))
-        csv = OutbreakType_ViewData_df.to_csv(index=False).encode('utf-8')
-        st.download_button("Download Data", data=csv, file_name="OutbreakType.csv", mime="text/csv",
-                           help='Click here to download the data as a CSV file')
+        download_data("outbreak_type", ("outbreak_type", outbreak_version, date1, date2, outbreak_setting,
+                                        institution_setting), lambda: OutbreakType_ViewData_df, "OutbreakType")
 # Causative Agent View Data
 with cl2:
     with st.expander("View Data (Outbreaks by Causative Agent)"):
         st.write(CausativeAgent_ViewData_df.style.background_gradient(cmap="Oranges"))
-        csv = CausativeAgent_ViewData_df.to_csv(index=False).encode('utf-8')
-        st.download_button("Download Data", data=csv, file_name="CausativeAgents.csv", mime="text/csv",
-                           help='Click here to download the data as a CSV file')
+        download_data("causative_agent", ("causative_agent", outbreak_version, date1, date2, outbreak_setting,
+                                          institution_setting), lambda: CausativeAgent_ViewData_df, "CausativeAgents")
+
+# The filtered outbreak rows themselves are only looked up when their download is prepared.
+with st.expander("Download Data (Filtered Outbreaks)"):
+    st.caption("%d outbreaks match the selected dates, setting and locations."
+               % OutbreakType_ViewData_df[COUNT].sum())
+    download_data("filtered_outbreaks", ("filtered_outbreaks", outbreak_version, date1, date2, outbreak_setting,
+                                         institution_setting),
+                  lambda: filter_outbreaks(outbreak_version, date1, date2, outbreak_setting, institution_setting),
+                  "Outbreaks", label="Download Outbreaks")
+
+
+# Start-to-declared-over intervals of every outbreak, built once per snapshot.
+@st.cache_resource(ttl=CACHE_TTL, max_entries=FRAME_CACHE_ENTRIES)
+@warmed
+def load_outbreak_intervals(outbreak_version):
+    return OutbreakIntervals(load_outbreaks(outbreak_version))
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=FILTER_CACHE_ENTRIES, show_spinner=False)
+def active_outbreaks(outbreak_version, date1, date2, setting=None, institutions=(), by=None):
+    # Outbreaks that started before date1 but were still open count too, so only setting and institutions
+    # narrow the intervals; the dates only choose which days are counted.
+    if setting == "--- View All ---":
+        setting = None
+    intervals = load_outbreak_intervals(outbreak_version)
+    if setting or institutions:
+        outbreaks = load_outbreaks(outbreak_version)
+        mask = np.ones(len(outbreaks), dtype=bool)
+        if setting:
+            mask &= (outbreaks["Outbreak Setting"] == setting).to_numpy()
+        if institutions:
+            mask &= outbreaks["Institution Name"].isin(institutions).to_numpy()
+        intervals = OutbreakIntervals(outbreaks[mask], as_of=intervals.as_of)
+    return intervals.active_counts(day_range(date1, date2), by), intervals.durations(by)
+
+
+def create_active_outbreaks_graph():
+    st.subheader("Active Outbreaks per Day")
+    split_by = st.selectbox('**Split by**', [None] + INTERVAL_GROUPS, index=1,
+                            format_func=lambda option: "Nothing" if option is None else option)
+    active_counts, durations = active_outbreaks(outbreak_version, date1, date2, outbreak_setting,
+                                                institution_setting, split_by)
+    fig = active_outbreaks_figure(active_counts)
+    plot_chart("active_outbreaks", fig, use_container_width=True)
+
+    with st.expander("View Data (Outbreak Durations)"):
+        st.write(durations)
+        download_data("active_outbreaks", ("active_outbreaks", outbreak_version, date1, date2, outbreak_setting,
+                                           institution_setting, split_by), lambda: active_counts, "ActiveOutbreaks",
+                      label="Download Daily Counts", index=True)
+
+
+create_active_outbreaks_graph()
+
+
+with span("data.load_ltc"):
+    df_LTC_covid_summary = load_ltc("ltc_summary", summary_version)
+
+
+# The LTC summary reduced to per-day totals once per snapshot; each period rollup is cached on top of it.
+@st.cache_resource(ttl=CACHE_TTL, max_entries=FRAME_CACHE_ENTRIES)
+@warmed
+def load_ltc_daily_totals(summary_version):
+    return freeze_frame(daily_totals(load_ltc("ltc_summary", summary_version)))
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=FILTER_CACHE_ENTRIES, show_spinner=False)
+def ltc_rollup(summary_version, period):
+    return rollup(load_ltc_daily_totals(summary_version), period)
+
+
+# Staff vaccination reduced to per-date, per-area totals before anything is joined to the daily summary.
+@st.cache_resource(ttl=CACHE_TTL, max_entries=FRAME_CACHE_ENTRIES)
+@warmed
+def load_vaccination_totals(vaccination_version, area="PHU"):
+    return freeze_frame(area_totals(load_ltc("ltc_vaccination", vaccination_version), area))
+
+
+@st.cache_resource(ttl=CACHE_TTL, max_entries=FRAME_CACHE_ENTRIES)
+@warmed
+def load_vaccination_summary(summary_version, vaccination_version):
+    rates = date_rates(load_vaccination_totals(vaccination_version))
+    return freeze_frame(join_summary(load_ltc("ltc_summary", summary_version), rates))
 
 
 # line chart for various time series of Covid-19 data in Long term care homes
 def load_time_series_graph():
-    time_series_df = df_LTC_covid_summary
-    time_series_df["month_year"] = time_series_df["Report Date"].dt.to_period("M")
-    time_series_df2 = time_series_df
-    text = ""
     st.subheader('Covid-19 Long Term Care Home Data from 2020 to 2023')
-    options = ["Health Worker and Resident Cases", "Active Outbreaks", "Resident Deaths"]
-    fig2 = px.line()
-    sel_filter = st.selectbox('**Choose an option**', options)
-    if sel_filter == options[1]:
-        text = options[1]
-        time_series_df = pd.DataFrame(time_series_df.groupby(time_series_df["month_year"].dt.strftime("%Y %b"))[
-                                          "LTC_Homes_with_Active_Outbreak"].sum()).reset_index()
-        fig2 = px.line(time_series_df, x="month_year", y="LTC_Homes_with_Active_Outbreak",
-                       labels={"LTC_Homes_with_Active_Outbreak": "Active Outbreaks"}, height=500, width=1000,
-                       template="gridon")
-        fig2.update_traces(
-            hovertemplate="<br>".join([
-                "<b>%{x}</b><br>" +
-                "Total Active Outbreaks: %{y}<extra></extra>"
-
-            ]))
-    elif sel_filter == options[2]:
-        text = options[2]
-        time_series_df["Daily Death Total"] = time_series_df.index
-        time_series_df["Daily Death Total"] = (
-                time_series_df['Total_LTC_Resident_Deaths'] - time_series_df['Total_LTC_Resident_Deaths'].shift())
-        time_series_df3 = pd.DataFrame(time_series_df.groupby(time_series_df["month_year"].dt.strftime("%Y %b"))[
-                                           "Daily Death Total"].sum())
-        fig2 = px.line(time_series_df3,
-                       labels={"value": "Resident Deaths"}, height=500, width=1000,
-                       template="gridon")
-        fig2.update_traces(
-            hovertemplate="<br>".join([
-                "<b>%{x}</b><br>" +
-                "Total Resident Deaths: %{y}<extra></extra>"
-
-            ]))
-        fig2.update_layout(showlegend=False)
-
-    elif sel_filter == options[0]:
-        text = options[0]
-        common_template = ('<b>%{customdata[0]} </b><br>' +
-                           'Average Cases: %{customdata[1]:.0f}<br>'
-                           )
-        time_series_df = time_series_df.groupby(pd.PeriodIndex((time_series_df['month_year']), freq="M"))[
-            'Confirmed_Active_LTC_HCW_Cases'].mean().rename('Average Health Worker Cases').reset_index()
-
-        time_series_df2 = time_series_df2.groupby(pd.PeriodIndex((time_series_df2['month_year']), freq="M"))[
-            'Confirmed_Active_LTC_Resident_Cases'].mean().rename('Average Resident Cases').reset_index()
-
-        time_series_df['Average Resident Cases'] = \
-            time_series_df2.groupby(pd.PeriodIndex((time_series_df['month_year']), freq="M"))[
-                'Average Resident Cases'].transform('mean')
-
-        time_series_df['month_year'] = time_series_df['month_year'].dt.strftime('%Y %b')
-        time_series_df2['month_year'] = time_series_df2['month_year'].dt.strftime('%Y %b')
-
-        fig2.add_trace(go.Scatter(
-            x=time_series_df['month_year'],
-            y=time_series_df['Average Health Worker Cases'],
-            name="Health Workers",
-            customdata=time_series_df,
-            hovertemplate=common_template,
-
-        ))
-        fig2.add_trace(go.Scatter(
-            x=time_series_df['month_year'],
-            y=time_series_df['Average Resident Cases'],
-            name="Residents",
-            customdata=time_series_df2,
-            hovertemplate=common_template,
-
-        ))
-
-    fig2['layout'].update(
-        xaxis=dict(title="Date", titlefont=dict(size=19)),
-        yaxis=dict(titlefont=dict(size=19)),
-        margin=dict(l=20, r=20, t=30, b=20),
-        hoverlabel=dict(
-            bgcolor="white",
-            font_color="black",
-            font_size=15,
-        ),
-
-    )
-
-    fig2.add_annotation(
-        text=f"Ontario Long-Term Care Home COVID-19 Data (open.canada.ca) / {today}<br>Source: Government of Canada"
-        , showarrow=False
-        , x=0
-        , y=-0.15
-        , xref='paper'
-        , yref='paper'
-        , xanchor='left'
-        , yanchor='bottom'
-        , xshift=-10
-        , yshift=-60
-        , font=dict(size=10, color="grey")
-        , align="left"
-        ,
-    )
-
-    st.plotly_chart(fig2, use_container_width=True)
+    sel_col, period_col = st.columns([3, 1])
+    with sel_col:
+        sel_filter = st.selectbox('**Choose an option**', TIME_SERIES_OPTIONS)
+    with period_col:
+        period = st.selectbox('**Group by**', list(PERIODS), index=list(PERIODS).index("Month"))
+    text = sel_filter
+    fig2, time_series_df = time_series_figure(ltc_rollup(summary_version, period), sel_filter)
+
+    plot_chart("time_series", fig2, use_container_width=True)
 
     with st.expander(("View Data (" + text + ")")):
         st.write(time_series_df.T.style.background_gradient(cmap="Blues"))
-        csv = time_series_df.to_csv(index=False).encode("utf-8")
-        st.download_button('Download Data', data=csv, file_name="TimeSeries.csv", mime='text/csv')
+        download_data("time_series", ("time_series", summary_version, period, sel_filter), lambda: time_series_df,
+                      "TimeSeries")
+
+    with st.expander("View Data (Staff Vaccination)"):
+        joined = load_vaccination_summary(summary_version, vaccination_version)
+        joined = joined[joined[VACCINATION_DATE].notna()].drop(columns=VACCINATION_DATE)
+        vaccination_columns = list(joined.columns[joined.columns.get_loc(HOMES_REPORTING):])
+        st.write(joined[["Report Date", ACTIVE_OUTBREAKS] + vaccination_columns])
+        area = st.selectbox('**Break down by**', AREAS)
+        st.write(area_rates(load_vaccination_totals(vaccination_version, area)))
 
 
 load_time_series_graph()
 
 
-def load_outbreaks_by_institution():
-    df_filtered_by_date['total_outbreak_institution'] = df_filtered_by_date.groupby('Institution Name')[
-        'Institution Name'].transform('count')
-
-    dfi = df_outbreaks_carehomes['Institution Name'].value_counts().to_frame().reset_index().rename(
-        #columns={'index': 'Institution Name', 'Institution Name': 'total outbreaks'})
-        columns={'outbreak count': 'Institution Name', 'count': 'total outbreaks'})
-
-    fig = px.bar(dfi.head(20), x="total outbreaks", y="Institution Name", color="total outbreaks")
-    #fig.update_traces(text=dfi["total outbreaks"])
-    fig['layout'].update(
-        title='Top 20 Outbreak Numbers by Institution <br>'
-              '(2016-Present)',
-        titlefont=dict(size=20),
-        xaxis=dict(title="Total Outbreaks", titlefont=dict(size=19), visible=False),
-        yaxis=dict(title="Institution Name", titlefont=dict(size=19), autorange='reversed'),
-        margin=dict(l=20, r=20, t=100, b=20),
-
-        hoverlabel=dict(
-            bgcolor="white",
-            font_color="black",
-            font_size=15,
-        ))
-    fig.update_traces(
-        hovertemplate="<br>".join([
-            "%{y}<br>" +
-            "<b>Total Outbreaks: %{x}</b><extra></extra>"
-
-        ]))
-
-    st.plotly_chart(fig, use_container_width=True)
+# Per-institution outbreak counts shared by every session. They outlive data versions: a new version that only
+# appends outbreaks (a delta sync) is added to the counts instead of recounting the whole history.
+@st.cache_resource(show_spinner=False)
+def institution_ranking():
+    return InstitutionRanking()
 
 
-def load_case_comparison_graph():
-    # Create a scatter plot
-    data1 = px.scatter(df_LTC_covid_summary, x="Confirmed_Active_LTC_Resident_Cases",
-                       y="Confirmed_Active_LTC_HCW_Cases",
-                       size="Total_LTC_Resident_Deaths")
+@st.cache_data(ttl=CACHE_TTL, max_entries=FILTER_CACHE_ENTRIES, show_spinner=False)
+def top_institutions(outbreak_version, k, date1=None, date2=None, setting=None):
+    if date1 is None:
+        ranking = institution_ranking()
+        ranking.sync(load_outbreaks(outbreak_version))
+        return ranking.top(k)
+    return top_k_in_cube(filter_outbreak_cube(outbreak_version, date1, date2, setting), k)
+
 
-    data1['layout'].update(
-        title="Resident Covid-19 Cases and Resident Deaths",
-        titlefont=dict(size=20), xaxis=dict(title="LTCH Resident Cases", titlefont=dict(size=19)),
-        yaxis=dict(title="LTCH Healthcare Worker Cases", titlefont=dict(size=19)),
-        margin=dict(l=20, r=20, t=100, b=20),
+def load_outbreaks_by_institution():
+    k_col, filter_col = st.columns(2)
+    with k_col:
+        k = st.slider("Institutions shown", min_value=5, max_value=50, value=20, step=5)
+    with filter_col:
+        within_filter = st.checkbox("Only the selected dates and setting")
+    if within_filter:
+        dfi = top_institutions(outbreak_version, k, date1, date2, outbreak_setting)
+        period = "%s to %s" % (date1.date(), date2.date())
+    else:
+        dfi = top_institutions(outbreak_version, k)
+        period = "2016-Present"
+
+    fig = outbreaks_by_institution_figure(dfi, period)
+    plot_chart("outbreaks_by_institution", fig, use_container_width=True)
 
-        hoverlabel=dict(
-            bgcolor="white",
-            font_color="black",
-            font_size=15,
-        ))
-    st.plotly_chart(data1, use_container_width=True)
+
+def load_case_comparison_graph():
+    data1 = case_comparison_figure(df_LTC_covid_summary)
+    plot_chart("case_comparison", data1, use_container_width=True)
 
 
 chart1, chart2 = st.columns(2)
@@ -384,66 +469,62 @@ with chart2:
     load_case_comparison_graph()
 
 
+# All three Age Group crosstabs, computed together once per snapshot; the selectbox just picks one.
+@st.cache_resource(ttl=CACHE_TTL, max_entries=FRAME_CACHE_ENTRIES, show_spinner=False)
+@warmed
+def load_demographic_crosstabs(covid_version):
+    crosstabs = demographic_crosstabs(load_covid_cases(covid_version))
+    return {option: freeze_frame(crosstab) for option, crosstab in crosstabs.items()}
+
+
 # Horizontal bar chart showing covid cases distribution with various filters
 def update_covid_demographics_bar_chart():
-    df2 = pd.DataFrame(df_covid_cases, columns=['Age Group', 'Assigned_ID', 'Client Gender', 'Source of Infection',
-                                                'Ever Hospitalized'])
-    options = ['Gender', 'Source of Infection', 'Hospitalizations']
-    df2.rename(columns={'Client Gender': 'Gender'}, inplace=True)
-    df2.rename(columns={'Client Gender': 'Gender'}, inplace=True)
-    df2.rename(columns={'Ever Hospitalized': 'Hospitalizations'}, inplace=True)
-    df2['Hospitalizations'].replace('Yes', 'Hospitalized', inplace=True)
-    df2['Hospitalizations'].replace('No', 'Not Hospitalized', inplace=True)
-    df2.drop(df2[df2['Source of Infection'] == 'No Information'].index, inplace=True)
-    df2.drop(df2[df2['Source of Infection'] == 'Pending'].index, inplace=True)
-    df2.drop(df2[df2['Gender'] == 'UNKNOWN'].index, inplace=True)
-    df2.drop(df2[df2['Gender'] == 'NOT LISTED, PLEASE SPECIFY'].index, inplace=True)
-
     st.subheader("Covid-19 Case Distribution by Age (2020 to Present)")
 
-    sel_filter = st.selectbox('**Choose an option**', options)
-    df4 = (df2.groupby(['Age Group', sel_filter])['Assigned_ID']
-           .count().unstack(sel_filter)
-           )
-
-    fig6 = px.bar(df4, orientation='h')
-    for data in fig6.data:
-        template = data.hovertemplate
-        template = template.replace(sel_filter + "=", "<b>") \
-            .replace("value=", "</b>Total Cases: ") \
-            .replace("Age Group=", "Age Group: ")
-        data.hovertemplate = template
-
-    fig6['layout'].update(
-        xaxis=dict(title="Number of Cases", titlefont=dict(size=19)),
-        yaxis=dict(title="Age Group", titlefont=dict(size=19), autorange="reversed"),
-        margin=dict(l=20, r=20, t=30, b=20),
-
-        hoverlabel=dict(
-            bgcolor="white",
-            font_color="black",
-            font_size=15,
-        )
-
-    )
-
-    fig6.add_annotation(
-        text=f"COVID-19 Cases in Toronto (open.toronto.ca) / {today}<br>Source: Toronto Public Health"
-        , showarrow=False
-        , x=0
-        , y=-0.15
-        , xref='paper'
-        , yref='paper'
-        , xanchor='left'
-        , yanchor='bottom'
-        , xshift=-75
-        , yshift=-15
-        , font=dict(size=10, color="grey")
-        , align="left"
-        ,
-    )
-
-    st.plotly_chart(fig6, use_container_width=True)
+    sel_filter = st.selectbox('**Choose an option**', DEMOGRAPHIC_OPTIONS)
+    # Usually finished downloading while the sections above were drawn.
+    with span("data.load_covid_cases"), st.spinner("Loading COVID-19 case data..."):
+        crosstabs = load_demographic_crosstabs(covid_version)
+    fig6 = covid_demographics_figure(crosstabs[sel_filter], sel_filter)
+    plot_chart("covid_demographics", fig6, use_container_width=True)
 
 
 update_covid_demographics_bar_chart()
+
+
+# Runs on the refresher thread for each new snapshot before it is published, so the first rerun on it finds the
+# indexes and aggregates already built. That thread is outside any script run, so it builds with the plain
+# functions, like read_covid_cases, and leaves the results in `stages` for the @warmed loaders.
+def warm_snapshot(stages, ranking, version):
+    version = snapshot.VERSION_PREFIX + version
+    datasets = {name: freeze_frame(snapshot.open_dataset(name, version[len(snapshot.VERSION_PREFIX):]))
+                for name in ("outbreaks", "ltc_summary", "ltc_vaccination")}
+    outbreaks, summary = datasets["outbreaks"], datasets["ltc_summary"]
+    vaccination_totals = freeze_frame(area_totals(datasets["ltc_vaccination"]))
+    crosstabs = demographic_crosstabs(read_covid_cases(version))
+    built = {("load_snapshot_dataset", name, version): df for name, df in datasets.items()}
+    built.update({
+        ("load_outbreak_index", version): OutbreakIndex(outbreaks),
+        ("load_outbreak_cube", version): OutbreakIndex(build_outbreak_cube(outbreaks)),
+        ("load_outbreak_intervals", version): OutbreakIntervals(outbreaks),
+        ("load_ltc_daily_totals", version): freeze_frame(daily_totals(summary)),
+        ("load_vaccination_totals", version): vaccination_totals,
+        ("load_vaccination_summary", version, version):
+            freeze_frame(join_summary(summary, date_rates(vaccination_totals))),
+        ("load_demographic_crosstabs", version):
+            {option: freeze_frame(crosstab) for option, crosstab in crosstabs.items()},
+    })
+    ranking.sync(outbreaks)
+    # Stages of an older version nobody loaded yet are stale now.
+    stages.clear()
+    stages.update(built)
+
+
+if refresher is not None:
+    refresher.warm = functools.partial(warm_snapshot, warmed_stages(), institution_ranking())
+
+timings = instrumentation.end_run(profile_run)
+if show_timings and timings:
+    with st.sidebar.expander("Stage timings", expanded=True):
+        st.caption("This rerun: %.0f ms" % timings["ms"])
+        st.dataframe(instrumentation.breakdown(timings), hide_index=True, use_container_width=True)
@@ -0,0 +1,32 @@
+from instrumentation import timed
+
+# Pre-aggregated outbreak counts. Every outbreak chart and view-data table is a sum over
+# some slice of this cube (see OutbreakIndex for slicing), so filters never touch the raw
+# outbreak history again.
+CUBE_DIMENSIONS = ["Date Outbreak Began", "Outbreak Setting", "Institution Name", "Type of Outbreak",
+                   "Causative Agent-1"]
+COUNT = "Number of Outbreaks"
+
+
+@timed("cube.build")
+def build_outbreak_cube(df):
+    # dropna=False keeps outbreaks with a missing agent in the per-type totals.
+    cube = df.groupby(CUBE_DIMENSIONS, observed=True, dropna=False).size().rename(COUNT).reset_index()
+    return cube.sort_values("Date Outbreak Began", ignore_index=True)
+
+
+def outbreaks_by_type(cube_slice):
+    return cube_slice.groupby("Type of Outbreak", as_index=False, observed=True)[COUNT].sum()
+
+
+def outbreaks_by_agent(cube_slice):
+    # Same layout as groupby('Type of Outbreak')['Causative Agent-1'].value_counts() on the raw rows.
+    g = cube_slice.groupby(["Type of Outbreak", "Causative Agent-1"], as_index=False, observed=True)[COUNT].sum()
+    g = g[g[COUNT] > 0]
+    return g.sort_values(["Type of Outbreak", COUNT], ascending=[True, False], ignore_index=True)
+
+
+def outbreaks_by_date_and_type(cube_slice):
+    # Date x outbreak type matrix of counts, one column per type.
+    return cube_slice.pivot_table(values=COUNT, index="Date Outbreak Began", columns="Type of Outbreak",
+                                  aggfunc="sum", observed=True)
@@ -0,0 +1,64 @@
+import numpy as np
+
+from frame_cache import freeze_frame
+from instrumentation import span, timed
+
+
+class OutbreakIndex:
+    """Outbreak rows sorted by start date, with posting lists for the filter columns.
+
+    A lookup binary-searches the date range, narrows each posting list to that range and
+    intersects them, so only matching rows are ever materialized.
+    """
+
+    def __init__(self, df, date_column="Date Outbreak Began", keys=("Outbreak Setting", "Institution Name")):
+        with span("index.build", rows=len(df)):
+            order = np.argsort(df[date_column].to_numpy(), kind="stable")
+            self.frame = freeze_frame(df.take(order).reset_index(drop=True))
+            self.date_column = date_column
+            self.dates = self.frame[date_column].to_numpy()
+            self.postings = {key: self._build_postings(self.frame[key]) for key in keys}
+
+    @staticmethod
+    def _build_postings(column):
+        # label -> ascending row positions; one stable argsort over the category codes.
+        if column.dtype == "category":
+            codes, labels = column.cat.codes.to_numpy(), column.cat.categories
+        else:
+            codes, labels = column.factorize()
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+        return {label: order[bounds[i]:bounds[i + 1]] for i, label in enumerate(labels)}
+
+    def date_range(self, date1, date2):
+        # Row positions [lo, hi) with date1 < date <= date2.
+        lo = np.searchsorted(self.dates, np.datetime64(date1), side="right")
+        hi = np.searchsorted(self.dates, np.datetime64(date2), side="right")
+        return lo, hi
+
+    def _posting_in_range(self, key, label, lo, hi):
+        posting = self.postings[key].get(label)
+        if posting is None:
+            return np.empty(0, dtype=np.intp)
+        return posting[np.searchsorted(posting, lo):np.searchsorted(posting, hi)]
+
+    def positions(self, date1, date2, setting=None, institutions=()):
+        lo, hi = self.date_range(date1, date2)
+        if not setting and not institutions:
+            return None, lo, hi
+        matches = None
+        if setting:
+            matches = self._posting_in_range("Outbreak Setting", setting, lo, hi)
+        if institutions:
+            postings = [self._posting_in_range("Institution Name", name, lo, hi) for name in institutions]
+            by_institution = np.unique(np.concatenate(postings))
+            matches = by_institution if matches is None else np.intersect1d(matches, by_institution,
+                                                                           assume_unique=True)
+        return matches, lo, hi
+
+    @timed("index.lookup")
+    def lookup(self, date1, date2, setting=None, institutions=()):
+        matches, lo, hi = self.positions(date1, date2, setting, institutions)
+        if matches is None:
+            return self.frame.iloc[lo:hi]
+        return self.frame.take(matches)
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+# Outbreaks as [Date Outbreak Began, Date Declared Over] intervals. An outbreak is active on a
+# day if it began on or before it and was not yet declared over the day before; outbreaks still
+# open count as active up to the latest date in the data. The number active on day d is
+#   #(starts <= d) - #(ends < d)
+# i.e. two binary searches into sorted start and end dates, so any set of days costs
+# O((n + days) log n) and no outbreak is ever expanded into daily rows.
+INTERVAL_GROUPS = ["Type of Outbreak", "Outbreak Setting", "Causative Agent-1"]
+ALL_OUTBREAKS = "All Outbreaks"
+DAY = np.timedelta64(1, "D")
+
+
+class OutbreakIntervals:
+
+    def __init__(self, df, began="Date Outbreak Began", over="Date Declared Over", as_of=None):
+        starts = df[began].to_numpy("datetime64[ns]")
+        ends = df[over].to_numpy("datetime64[ns]")
+        known = ~np.isnat(starts)
+        self.frame = df.loc[known, [column for column in INTERVAL_GROUPS if column in df.columns]]
+        starts, ends = starts[known], ends[known]
+        if as_of is None:
+            known_dates = np.concatenate([starts, ends[~np.isnat(ends)]])
+            as_of = known_dates.max() if len(known_dates) else np.datetime64("NaT")
+        self.as_of = np.datetime64(as_of, "ns")
+        self.open = np.isnat(ends)
+        # Ends are stored as the last active day; open outbreaks run to as_of, bad rows end on their start.
+        self.starts = starts
+        self.ends = np.maximum(np.where(self.open, self.as_of, ends), starts)
+        self._sorted = {}
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _events(self, by):
+        # Start and end dates sorted within each group, plus each group's slice bounds; built once per grouping.
+        if by not in self._sorted:
+            if by is None:
+                labels, codes = pd.Index([ALL_OUTBREAKS]), np.zeros(len(self), dtype=np.intp)
+            else:
+                column = self.frame[by]
+                codes, labels = column.cat.codes.to_numpy(), column.cat.categories
+            order = np.lexsort((self.starts, codes))
+            bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+            starts = self.starts[order]
+            ends = self.ends[order].copy()
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                ends[lo:hi].sort()
+            self._sorted[by] = labels, bounds, starts, ends
+        return self._sorted[by]
+
+    @timed("intervals.active_counts")
+    def active_counts(self, days, by=None):
+        """Frame of outbreaks active on each of days (index), one column per group of `by`."""
+        days = np.asarray(days, dtype="datetime64[ns]")
+        labels, bounds, starts, ends = self._events(by)
+        columns = {}
+        for label, lo, hi in zip(labels, bounds[:-1], bounds[1:]):
+            if hi == lo:
+                continue
+            started = np.searchsorted(starts[lo:hi], days, side="right")
+            ended = np.searchsorted(ends[lo:hi], days, side="left")
+            columns[str(label)] = started - ended
+        counts = pd.DataFrame(columns, index=pd.DatetimeIndex(days, name="Date"))
+        return counts.loc[:, counts.any(axis=0)] if len(counts.columns) else counts
+
+    @timed("intervals.durations")
+    def durations(self, by=None):
+        """Per group: outbreak count, still open, and median / mean / longest duration in days."""
+        days = (self.ends - self.starts) / DAY + 1
+        groups = pd.Series(ALL_OUTBREAKS, index=self.frame.index) if by is None else self.frame[by]
+        stats = pd.DataFrame({"group": groups.to_numpy(), "days": days, "open": self.open})
+        summary = stats.groupby("group", observed=True).agg(
+            outbreaks=("days", "size"), still_open=("open", "sum"), median_days=("days", "median"),
+            mean_days=("days", "mean"), longest_days=("days", "max"))
+        summary.index = summary.index.astype(str)
+        summary.index.name = by or ALL_OUTBREAKS
+        return summary.round(1).reset_index()
+
+
+def day_range(date1, date2):
+    # Days date1 < d <= date2, matching the dashboard's date filter.
+    return pd.date_range(pd.Timestamp(date1) + pd.Timedelta(days=1), pd.Timestamp(date2), freq="D")
@@ -0,0 +1,137 @@
+"""Keep the dashboard snapshot up to date in the background.
+
+Polls the CKAN packages (and the LTC files) on a schedule and, when any of them changed, builds a
+new snapshot off the request path and swaps it in:
+
+    python refresher.py [--interval 300] [--snapshot-dir snapshots] [--once]
+
+The Streamlit dashboard runs the same refresher in-process when DASHBOARD_REFRESH_INTERVAL is set.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+
+import ingest
+import instrumentation
+import schemas
+import snapshot
+from ckan_data import COVID_CASES_DATASET, OUTBREAK_CAREHOME_DATASET, dataset_version
+from frame_cache import file_version
+from instrumentation import span
+
+REFRESH_INTERVAL = int(os.environ.get("DASHBOARD_REFRESH_INTERVAL", "0"))  # seconds; 0 leaves refreshing off
+
+CKAN_SOURCES = {"covid_cases": COVID_CASES_DATASET, "outbreaks": OUTBREAK_CAREHOME_DATASET}
+
+logger = logging.getLogger(__name__)
+
+
+def source_versions():
+    # One package_show per CKAN package and a stat per LTC file; no data is downloaded.
+    versions = {name: dataset_version(dataset) for name, dataset in CKAN_SOURCES.items()}
+    versions.update({name: file_version(path) for name, (path, _) in ingest.LTC_FILES.items()})
+    # A changed normalization rebuilds the snapshot even when the data did not change.
+    versions["schemas"] = schemas.fingerprint()
+    return versions
+
+
+class SnapshotRefresher:
+    """Builds a new snapshot whenever the sources no longer match the current one.
+
+    A new version is written without being made current, handed to `warm` (which can build the
+    indexes and aggregates the dashboard needs for it), and only then published: CURRENT is
+    swapped in one rename and `version` is updated. Readers pick a version once and keep using
+    it, so a rerun or callback that started on the old version finishes on it.
+    """
+
+    def __init__(self, interval=REFRESH_INTERVAL, root=snapshot.SNAPSHOT_DIR, warm=None):
+        self.interval = interval
+        self.root = root
+        self.warm = warm
+        self.version = snapshot.current_version(root)
+        self.checked = None
+        self.error = None
+        # Set once a version is available or the first attempt at building one has failed.
+        self.ready = threading.Event()
+        if self.version:
+            self.ready.set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self, force_refresh=False):
+        """Check the sources once and build and publish a new version if they changed; returns the current one."""
+        with self._lock, instrumentation.recording("refresh"):
+            with span("refresh.check"):
+                sources = source_versions()
+            current = snapshot.current_version(self.root)
+            if (current and not force_refresh
+                    and snapshot.read_manifest(current, self.root).get("sources") == sources):
+                self.version, self.checked = current, time.time()
+                return current
+
+            start = time.perf_counter()
+            with span("refresh.build"):
+                version = ingest.build_snapshot(self.root, force_refresh=force_refresh, sources=sources,
+                                                make_current=False)
+            if self.warm is not None:
+                with span("refresh.warm"):
+                    try:
+                        self.warm(version)
+                    except Exception:
+                        # Cold caches only cost the first request on the new version; still publish it.
+                        logger.exception("warming snapshot %s failed", version)
+            snapshot.publish(version, self.root)
+            self.version, self.checked = version, time.time()
+            logger.info("snapshot %s published in %.1fs", version, time.perf_counter() - start)
+            return version
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+                self.error = None
+            except Exception as e:
+                # Keep serving the last good version and try again on the next tick.
+                self.error = e
+                logger.exception("snapshot refresh failed")
+            self.ready.set()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="snapshot-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait(self, timeout=None):
+        """Block until a version is available (only needed before the very first build); None if it failed."""
+        self.ready.wait(timeout)
+        return self.version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval", type=int, default=REFRESH_INTERVAL or 300, help="seconds between checks")
+    parser.add_argument("--snapshot-dir", default=snapshot.SNAPSHOT_DIR, help="where snapshot versions are kept")
+    parser.add_argument("--once", action="store_true", help="check once, refreshing if needed, and exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    refresher = SnapshotRefresher(args.interval, args.snapshot_dir)
+    if args.once:
+        print("current snapshot: %s" % refresher.refresh())
+        return
+    refresher.run()
+
+
+if __name__ == "__main__":
+    main()
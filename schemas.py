@@ -0,0 +1,194 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span, timed
+
+# Declared column types for every dataset the dashboards read. Repeated strings are
+# loaded as categoricals so filters and groupbys work on integer codes, counts use
+# the smallest integer type that fits, and dates are parsed with a fixed format.
+#
+# Each schema also declares how its dataset is normalized, once per snapshot (see normalize()):
+#   columns   the columns the dashboards rely on, checked after renaming
+#   rename    source column name -> dashboard column name
+#   relabel   {column: {label: new label}}, whole category labels
+#   replace   {column: {text: new text}}, substrings of category labels
+#   exclude   {column: [labels]}, rows with these values are dropped
+AGE_GROUPS = ["19 and younger", "20 to 29 Years", "30 to 39 Years", "40 to 49 Years", "50 to 59 Years",
+              "60 to 69 Years", "70 to 79 Years", "80 to 89 Years", "90 and older"]
+
+COVID_CASES_SCHEMA = {
+    "name": "covid_cases",
+    "usecols": ["_id", "Assigned_ID", "Age Group", "Client Gender", "Source of Infection", "Ever Hospitalized"],
+    "dtype": {"_id": "int32", "Assigned_ID": "int32", "Age Group": "category", "Client Gender": "category",
+              "Source of Infection": "category", "Ever Hospitalized": "category"},
+    "ordered": {"Age Group": AGE_GROUPS},
+    "dates": {},
+    "columns": ["_id", "Assigned_ID", "Age Group", "Client Gender", "Source of Infection", "Ever Hospitalized"],
+    "relabel": {"Ever Hospitalized": {"Yes": "Hospitalized", "No": "Not Hospitalized"}},
+    # Cases without a usable gender or source of infection are left out of the demographics.
+    "exclude": {"Source of Infection": ["No Information", "Pending"],
+                "Client Gender": ["UNKNOWN", "NOT LISTED, PLEASE SPECIFY"]},
+}
+
+# The CKAN dump spells the agent columns "Causative Agent - 1"; both spellings are read.
+OUTBREAKS_SCHEMA = {
+    "name": "outbreaks",
+    "usecols": ["_id", "Institution Name", "Outbreak Setting", "Type of Outbreak", "Causative Agent-1",
+                "Causative Agent-2", "Causative Agent - 1", "Causative Agent - 2", "Date Outbreak Began",
+                "Date Declared Over", "Active"],
+    "dtype": {"_id": "int32", "Institution Name": "category", "Outbreak Setting": "category",
+              "Type of Outbreak": "category", "Causative Agent-1": "category", "Causative Agent-2": "category",
+              "Causative Agent - 1": "category", "Causative Agent - 2": "category", "Active": "category"},
+    "ordered": {},
+    "dates": {"Date Outbreak Began": "ISO8601", "Date Declared Over": "ISO8601"},
+    "columns": ["_id", "Institution Name", "Outbreak Setting", "Type of Outbreak", "Causative Agent-1",
+                "Causative Agent-2", "Date Outbreak Began", "Date Declared Over", "Active"],
+    "rename": {"Causative Agent - 1": "Causative Agent-1", "Causative Agent - 2": "Causative Agent-2"},
+    "replace": {"Outbreak Setting": {"LTCH": "Long-Term Care Home"},
+                "Institution Name": {"LTCH": "Long-Term Care Home"}},
+}
+
+# The LTC files name their date columns differently; both become "Report Date".
+LTC_SUMMARY_SCHEMA = {
+    "name": "ltc_summary",
+    "dtype": {"LTC_Homes_with_Active_Outbreak": "int16", "LTC_Homes_with_Resolved_Outbreak": "int16",
+              "Confirmed_Active_LTC_Resident_Cases": "int32", "Confirmed_Active_LTC_HCW_Cases": "int32",
+              "Total_LTC_Resident_Deaths": "int32", "Total_LTC_HCW_Deaths": "int16",
+              "Active_Outbreaks_with_No_Resident_Cases": "float32"},
+    "encoding": "ISO-8859-1",
+    "ordered": {},
+    "dates": {"Report Date": "%Y-%m-%d"},
+    "columns": ["Report Date", "LTC_Homes_with_Active_Outbreak", "LTC_Homes_with_Resolved_Outbreak",
+                "Confirmed_Active_LTC_Resident_Cases", "Confirmed_Active_LTC_HCW_Cases", "Total_LTC_Resident_Deaths",
+                "Total_LTC_HCW_Deaths", "Active_Outbreaks_with_No_Resident_Cases"],
+    "rename": {"Report_Data_Extracted": "Report Date"},
+}
+
+LTC_VACCINATION_SCHEMA = {
+    "name": "ltc_vaccination",
+    "dtype": {"LTC_Home": "category", "LTC_Home_Number": "category", "City": "category", "PHU": "category",
+              "1st_dose_percentage_staff_vaccination_rate": "float32",
+              "2nd_dose_percentage_staff_vaccination_rate": "float32"},
+    "encoding": "ISO-8859-1",
+    "ordered": {},
+    "dates": {"Report Date": "%Y-%m-%d"},
+    "columns": ["Report Date", "LTC_Home", "LTC_Home_Number", "City", "PHU",
+                "1st_dose_percentage_staff_vaccination_rate", "2nd_dose_percentage_staff_vaccination_rate"],
+    "rename": {"Date_Collected": "Report Date"},
+}
+
+# CKAN package id -> schema of its datastore resources.
+DATASET_SCHEMAS = {
+    "covid-19-cases-in-toronto": COVID_CASES_SCHEMA,
+    "outbreaks-in-toronto-healthcare-institutions": OUTBREAKS_SCHEMA,
+}
+
+
+def read_options(schema):
+    # Keyword arguments for pd.read_csv that load only the declared columns with their types.
+    if schema is None:
+        return {}
+    options = {"dtype": schema["dtype"]}
+    if "encoding" in schema:
+        options["encoding"] = schema["encoding"]
+    if "usecols" in schema:
+        usecols = set(schema["usecols"])
+        options["usecols"] = lambda column: column in usecols
+    return options
+
+
+def read_csv(path, schema, **kwargs):
+    with span("csv.read", path=path):
+        df = pd.read_csv(path, **read_options(schema), **kwargs)
+    return normalize(df, schema)
+
+
+@timed("schema.apply")
+def apply_schema(df, schema):
+    """Cast df to the schema's types; cheap for columns that already have them."""
+    if schema is None:
+        return df
+    for column, dtype in schema["dtype"].items():
+        if column in df.columns and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    for column, order in schema["ordered"].items():
+        if column in df.columns:
+            present = df[column].cat.categories
+            categories = [c for c in order if c in present] + [c for c in present if c not in order]
+            df[column] = df[column].cat.set_categories(categories, ordered=True)
+    for column, date_format in schema["dates"].items():
+        if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column], format=date_format)
+    return df
+
+
+class SchemaError(ValueError):
+    """A dataset no longer has the columns its schema declares, e.g. after an upstream change."""
+
+
+def _relabel(column, relabel):
+    # Rewrites each category label once, however many rows carry it; labels that end up equal are merged.
+    labels = [relabel(label) for label in column.cat.categories]
+    categories = pd.unique(np.array(labels, dtype=object))
+    if len(categories) == len(labels):
+        return column.cat.rename_categories(labels)
+    remap = np.append(pd.Index(categories).get_indexer(labels), -1)
+    return pd.Series(pd.Categorical.from_codes(remap[column.cat.codes.to_numpy()], categories),
+                     index=column.index, name=column.name)
+
+
+def _replace_all(replacements):
+    def replace(label):
+        for text, new_text in replacements.items():
+            label = label.replace(text, new_text)
+        return label
+    return replace
+
+
+@timed("schema.normalize")
+def normalize(df, schema):
+    """Rename, check, type, relabel and filter df as its schema declares; safe to apply more than once."""
+    if schema is None:
+        return df
+    # Latin-1 reads of the LTC files keep their UTF-8 byte-order mark on the first column name.
+    renames = {column: column.lstrip("\ufeff").replace("\xef\xbb\xbf", "", 1) for column in df.columns}
+    renames = {column: schema.get("rename", {}).get(name, name) for column, name in renames.items()}
+    if any(column != name for column, name in renames.items()):
+        df = df.rename(columns=renames)
+    missing = [column for column in schema.get("columns", ()) if column not in df.columns]
+    if missing:
+        raise SchemaError("%s: missing columns %s (got %s)" % (schema.get("name"), missing, list(df.columns)))
+
+    df = apply_schema(df, schema)
+    for column, mapping in schema.get("relabel", {}).items():
+        df[column] = _relabel(df[column], lambda label: mapping.get(label, label))
+    for column, replacements in schema.get("replace", {}).items():
+        df[column] = _relabel(df[column], _replace_all(replacements))
+    excluded = schema.get("exclude", {})
+    if excluded:
+        keep = np.ones(len(df), dtype=bool)
+        for column, labels in excluded.items():
+            keep &= ~df[column].isin(labels).to_numpy()
+        if not keep.all():
+            df = df[keep].reset_index(drop=True)
+        for column, labels in excluded.items():
+            df[column] = df[column].cat.remove_categories([label for label in labels
+                                                           if label in df[column].cat.categories])
+    return df
+
+
+def fingerprint():
+    # Changes whenever a schema does, so snapshots normalized under an older one are rebuilt.
+    schemas = {schema["name"]: schema for schema in
+               (COVID_CASES_SCHEMA, OUTBREAKS_SCHEMA, LTC_SUMMARY_SCHEMA, LTC_VACCINATION_SCHEMA)}
+    return hashlib.sha1(json.dumps(schemas, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def plain_labels(df):
+    # Plotly Express groups on label columns itself and trips over unused categories,
+    # so small chart-ready aggregates are handed over with plain object labels.
+    categorical = df.select_dtypes("category").columns
+    return df.astype({column: object for column in categorical}) if len(categorical) else df
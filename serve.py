@@ -0,0 +1,52 @@
+"""Serve the Dash app in main.py with several worker processes (gunicorn):
+
+    python serve.py [--workers 4] [--threads 4] [--bind 0.0.0.0:8050]
+
+The app is loaded once in the master process before the workers are forked. Workers map the same
+outbreak data and share callback results through the directory in DASHBOARD_SHARED_DIR (see
+shared_data.py), so memory per worker stays flat as workers are added. Any other WSGI server can
+serve `serve:server` instead, e.g. `gunicorn --preload -w 4 serve:server`.
+"""
+import argparse
+import os
+
+import main as dash_app
+
+server = dash_app.app.server
+
+WORKERS = int(os.environ.get("DASHBOARD_WORKERS", str(os.cpu_count() or 1)))
+THREADS = int(os.environ.get("DASHBOARD_THREADS", "4"))
+BIND = os.environ.get("DASHBOARD_BIND", "0.0.0.0:8050")
+
+
+def run(workers=WORKERS, threads=THREADS, bind=BIND, timeout=60):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("serve.py needs gunicorn: pip install -r requirements-serve.txt")
+
+    class DashApplication(BaseApplication):
+
+        def load_config(self):
+            for key, value in {"bind": bind, "workers": workers, "threads": threads, "timeout": timeout,
+                               "preload_app": True, "accesslog": "-"}.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return server
+
+    DashApplication().run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes")
+    parser.add_argument("--threads", type=int, default=THREADS, help="request threads per worker")
+    parser.add_argument("--bind", default=BIND, help="host:port to listen on")
+    parser.add_argument("--timeout", type=int, default=60, help="seconds before a stuck worker is restarted")
+    args = parser.parse_args(argv)
+    run(args.workers, args.threads, args.bind, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
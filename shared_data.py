@@ -0,0 +1,87 @@
+import functools
+import hashlib
+import os
+import pickle
+
+import snapshot
+from disk_store import evict_lru, write_atomically
+
+# Data shared by the worker processes serving the Dash app (see serve.py), kept on disk so that
+# workers started separately share it as well as forked ones:
+# - frames are written once per data version as Arrow files that every worker memory-maps, so the
+#   pages are held once in the OS page cache instead of once per worker;
+# - callback results are pickled into a result directory, so a filter computed by one worker is
+#   served by all of them.
+SHARED_DIR = os.environ.get("DASHBOARD_SHARED_DIR", ".dash_shared")
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("DASHBOARD_RESULT_CACHE_MB", "64")) * 1024 * 1024
+
+MISSING = object()
+
+
+def shared_frame(name, version, build, directory=SHARED_DIR):
+    """The frame build() returns, written once per version as an Arrow file and memory-mapped read-only."""
+    path = os.path.join(directory, "%s-%s.arrow" % (name, version))
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        df = build()
+        write_atomically(directory, path, lambda tmp: snapshot.write_table(df, tmp))
+        # Older versions can go; workers still mapping them keep their pages until they exit.
+        for stale in os.listdir(directory):
+            if stale.startswith(name + "-") and stale.endswith(".arrow") and stale != os.path.basename(path):
+                os.remove(os.path.join(directory, stale))
+    return snapshot.map_table(path)
+
+
+class ResultCache:
+    """Pickled function results in a directory shared by processes, evicted least recently used first."""
+
+    def __init__(self, cache_dir=os.path.join(SHARED_DIR, "results"), max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + ".pickle")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return MISSING
+        try:
+            # The modification time doubles as the last access time for eviction.
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        def write(tmp):
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        write_atomically(self.cache_dir, self._path(key), write)
+        self.evict()
+
+    def evict(self):
+        evict_lru(self.cache_dir, ".pickle", self.max_bytes)
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pickle"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def memoize(self, version):
+        """Decorator caching fn(*args) under (fn name, version, args); args must have a stable repr."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args):
+                key = (fn.__module__, fn.__qualname__, version) + args
+                value = self.get(key)
+                if value is MISSING:
+                    value = fn(*args)
+                    self.put(key, value)
+                return value
+            return wrapper
+        return decorate
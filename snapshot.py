@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pyarrow as pa
+
+from instrumentation import span
+
+# Versioned columnar snapshots of the dashboard datasets. Each version is a directory of
+# uncompressed Arrow IPC files (one per dataset) plus a manifest; CURRENT names the newest
+# complete version. Files are memory-mapped when opened, so processes reading the same
+# snapshot share its pages through the OS page cache.
+SNAPSHOT_DIR = os.environ.get("DASHBOARD_SNAPSHOT_DIR", "snapshots")
+KEEP_SNAPSHOTS = int(os.environ.get("DASHBOARD_KEEP_SNAPSHOTS", "3"))
+VERSION_PREFIX = "snapshot:"
+
+
+def current_version(root=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def is_snapshot_version(version):
+    return isinstance(version, str) and version.startswith(VERSION_PREFIX)
+
+
+def read_manifest(version, root=SNAPSHOT_DIR):
+    with open(os.path.join(root, version, "manifest.json")) as f:
+        return json.load(f)
+
+
+def write_snapshot(frames, root=SNAPSHOT_DIR, keep=KEEP_SNAPSHOTS, sources=None, make_current=True):
+    """Write {name: DataFrame} as a new snapshot version and make it current.
+
+    sources records what the frames were built from (see refresher.py). With make_current=False the
+    version is written but only becomes current when publish() is called.
+    """
+    os.makedirs(root, exist_ok=True)
+    # Staged in a private directory: the in-process refresher and a standalone refresher.py may write at once.
+    tmp_dir = tempfile.mkdtemp(dir=root, prefix=".staging-")
+    os.chmod(tmp_dir, 0o755)
+    manifest = {"created": time.time(), "sources": sources, "datasets": {}}
+    for name, df in frames.items():
+        file_name = name + ".arrow"
+        write_table(df, os.path.join(tmp_dir, file_name))
+        manifest["datasets"][name] = {"file": file_name, "rows": len(df), "columns": list(df.columns)}
+
+    # Versions are named by the second they were written; a writer that loses the rename to a version of the
+    # same name takes the next suffix.
+    base = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    suffix = 0
+    while True:
+        version = "%s-%d" % (base, suffix) if suffix else base
+        manifest["version"] = version
+        with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        try:
+            os.rename(tmp_dir, os.path.join(root, version))
+            break
+        except OSError:
+            if not os.path.exists(os.path.join(root, version)):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+            suffix += 1
+    if make_current:
+        publish(version, root, keep)
+    return version
+
+
+def publish(version, root=SNAPSHOT_DIR, keep=KEEP_SNAPSHOTS):
+    # Swap CURRENT in one rename so readers see either the old or the new version. The pointer is written
+    # through a private temporary file, so concurrent publishers never share one.
+    fd, tmp = tempfile.mkstemp(dir=root, prefix=".CURRENT-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(version)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, os.path.join(root, "CURRENT"))
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    prune(root, keep)
+
+
+def write_table(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def map_table(path):
+    source = pa.memory_map(path)
+    table = pa.ipc.open_file(source).read_all()
+    # split_blocks lets numeric and datetime columns stay views of the mapped file.
+    return table.to_pandas(split_blocks=True)
+
+
+def version_order(version):
+    # Oldest first; "20240101T000000-10" was written after "-2".
+    base, _, suffix = version.partition("-")
+    return base, int(suffix) if suffix.isdigit() else 0
+
+
+def prune(root=SNAPSHOT_DIR, keep=KEEP_SNAPSHOTS):
+    # Old versions can be deleted while mapped elsewhere; the pages live until unmapped.
+    current = current_version(root)
+    versions = sorted((name for name in os.listdir(root)
+                       if os.path.isdir(os.path.join(root, name)) and not name.startswith(".")), key=version_order)
+    for version in versions[:-keep] if keep else []:
+        if version != current:
+            shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+
+def open_dataset(name, version=None, root=SNAPSHOT_DIR):
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError("no snapshot in %s; run `python ingest.py` first" % root)
+    manifest = read_manifest(version, root)
+    with span("snapshot.open", dataset=name):
+        return map_table(os.path.join(root, version, manifest["datasets"][name]["file"]))
+
+
+def open_snapshot(version=None, root=SNAPSHOT_DIR):
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError("no snapshot in %s; run `python ingest.py` first" % root)
+    return {name: open_dataset(name, version, root) for name in read_manifest(version, root)["datasets"]}
@@ -0,0 +1,73 @@
+import io
+
+import pandas as pd
+import pytest
+
+import ckan_sync
+from schemas import apply_schema, read_options
+
+SCHEMA = {"usecols": ["_id", "Institution Name", "Outbreak Setting", "Date Outbreak Began"],
+          "dtype": {"_id": "int32", "Institution Name": "category", "Outbreak Setting": "category"},
+          "ordered": {}, "dates": {"Date Outbreak Began": "ISO8601"}}
+
+
+def remote_table(rows):
+    return pd.DataFrame({"_id": range(1, rows + 1),
+                         "Institution Name": ["Home %d" % (i % 4) for i in range(rows)],
+                         "Outbreak Setting": ["LTCH" if i % 3 else "Hospital-Acute Care" for i in range(rows)],
+                         "Date Outbreak Began": pd.date_range("2023-01-01", periods=rows).strftime("%Y-%m-%d"),
+                         "Unused": ["x"] * rows})
+
+
+def read_dump(table, schema):
+    # What a forced full refresh parses: the whole table as one CSV dump.
+    return apply_schema(pd.read_csv(io.StringIO(table.to_csv(index=False)), **read_options(schema)), schema)
+
+
+@pytest.fixture
+def datastore(monkeypatch):
+    # A stub datastore_search over a table the test sets, with a small page size so paging is exercised.
+    state = {}
+
+    def datastore_search(base_url, resource_id, offset=0, limit=100, **params):
+        table = state["table"]
+        result = {"fields": [{"id": column} for column in table.columns], "total": len(table)}
+        if limit:
+            page = table.sort_values("_id").iloc[offset:offset + limit]
+            result["records"] = page.to_csv(index=False, header=False)
+        return result
+
+    monkeypatch.setattr(ckan_sync, "datastore_search", datastore_search)
+    monkeypatch.setattr(ckan_sync, "PAGE_SIZE", 2)
+    return state
+
+
+@pytest.mark.parametrize("held, rows", [(7, 10), (7, 8), (3, 9), (1, 2)])
+def test_delta_sync_matches_full_refresh(datastore, held, rows):
+    datastore["table"] = remote_table(rows)
+    local = read_dump(remote_table(held), SCHEMA)
+    synced = apply_schema(ckan_sync.sync_resource("http://ckan", {"id": "r"}, local, schema=SCHEMA), SCHEMA)
+    pd.testing.assert_frame_equal(synced, read_dump(datastore["table"], SCHEMA), check_categorical=False)
+
+
+def test_no_new_rows_needs_full_dump(datastore):
+    # Same row count with changed metadata means rows were edited in place.
+    datastore["table"] = remote_table(5)
+    local = read_dump(remote_table(5), SCHEMA)
+    assert ckan_sync.sync_resource("http://ckan", {"id": "r"}, local, schema=SCHEMA) is None
+
+
+@pytest.mark.parametrize("change", ["renumbered", "shrunk", "new column", "empty local"])
+def test_rewritten_resource_needs_full_dump(datastore, change):
+    table, local, schema = remote_table(10), read_dump(remote_table(6), SCHEMA), SCHEMA
+    if change == "renumbered":
+        table["_id"] += 100
+    elif change == "shrunk":
+        table = remote_table(4)
+    elif change == "new column":
+        table.insert(1, "Active", "Y")
+        schema = dict(SCHEMA, usecols=SCHEMA["usecols"] + ["Active"])
+    else:
+        local = local.iloc[:0]
+    datastore["table"] = table
+    assert ckan_sync.sync_resource("http://ckan", {"id": "r"}, local, schema=schema) is None
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+import pytest
+
+from downsample import downsample, line_trace, lttb_indices
+
+
+def series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.date_range("2020-01-01", periods=n).to_numpy(), rng.normal(size=n).cumsum()
+
+
+@pytest.mark.parametrize("n, budget", [(10, 3), (1000, 100), (5001, 1000), (2000, 1999)])
+def test_downsample_keeps_ends_and_budget(n, budget):
+    x, y = series(n)
+    dx, dy = downsample(x, y, budget)
+    assert len(dx) == len(dy) == budget
+    assert dx[0] == x[0] and dy[0] == y[0]
+    assert dx[-1] == x[-1] and dy[-1] == y[-1]
+    # Points are picked from the series, in order.
+    positions = np.searchsorted(x, dx)
+    assert (np.diff(positions) > 0).all()
+    np.testing.assert_array_equal(y[positions], dy)
+
+
+def test_lttb_keeps_the_peak_of_each_bucket():
+    x = np.arange(100)
+    y = np.zeros(100)
+    y[37] = 50.0
+    assert 37 in lttb_indices(x, y, 10)
+
+
+@pytest.mark.parametrize("n", [0, 1, 5, 100])
+def test_short_series_come_back_unchanged(n):
+    x, y = series(n)
+    dx, dy = downsample(x, y, budget=100)
+    np.testing.assert_array_equal(dx, x)
+    np.testing.assert_array_equal(dy, y)
+
+
+def test_line_trace_downsamples_and_switches_to_webgl():
+    x, y = series(5000)
+    trace = line_trace(x, y, budget=1000, threshold=500)
+    assert isinstance(trace, go.Scattergl)
+    assert len(trace.x) == 1000
+    small = line_trace(x[:50], y[:50], budget=1000, threshold=500)
+    assert isinstance(small, go.Scatter)
+    assert len(small.x) == 50
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from institution_ranking import RANK_COLUMNS, top_k_in_cube
+from outbreak_cube import build_outbreak_cube
+
+
+def test_top_k_in_cube_skips_outbreaks_without_institution():
+    df = pd.DataFrame({
+        "Date Outbreak Began": pd.to_datetime(["2023-01-01", "2023-01-01", "2023-01-02", "2023-01-03"]),
+        "Outbreak Setting": pd.Categorical(["LTCH", "LTCH", "LTCH", "Hospital-Acute Care"]),
+        "Institution Name": pd.Categorical(["Home A", np.nan, "Home A", "Hospital B"]),
+        "Type of Outbreak": pd.Categorical(["Respiratory"] * 4),
+        "Causative Agent-1": pd.Categorical(["COVID-19"] * 4),
+    })
+    cube = build_outbreak_cube(df)
+    assert (cube["Institution Name"].cat.codes == -1).any()
+
+    ranking = top_k_in_cube(cube, 5)
+    assert list(ranking.columns) == RANK_COLUMNS
+    assert ranking.values.tolist() == [["Home A", 2], ["Hospital B", 1]]
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from outbreak_index import OutbreakIndex
+from outbreak_intervals import INTERVAL_GROUPS, OutbreakIntervals, day_range
+
+SETTINGS = ["LTCH", "Hospital-Acute Care", "Retirement Home", "Hospital-Chronic Care"]
+INSTITUTIONS = ["Home %d" % i for i in range(12)]
+
+
+def outbreaks(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    began = pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D")
+    over = began + pd.to_timedelta(rng.integers(-3, 60, n), unit="D")  # a few end before they start
+    over = over.where(rng.random(n) > 0.1)  # still open
+    began = began.where(rng.random(n) > 0.02)  # no start date
+    institutions = pd.Series(rng.choice(INSTITUTIONS, n)).where(rng.random(n) > 0.05)
+    return pd.DataFrame({
+        "_id": np.arange(n),
+        "Date Outbreak Began": began,
+        "Date Declared Over": over,
+        "Outbreak Setting": pd.Categorical(rng.choice(SETTINGS, n), categories=SETTINGS),
+        "Institution Name": pd.Categorical(institutions, categories=INSTITUTIONS),
+        "Type of Outbreak": pd.Categorical(rng.choice(["Respiratory", "Enteric"], n)),
+        "Causative Agent-1": pd.Categorical(rng.choice(["COVID-19", "Norovirus", "Influenza A"], n)),
+    })
+
+
+def random_filters(seed, count=50):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        date1 = pd.Timestamp("2021-12-01") + pd.Timedelta(days=int(rng.integers(0, 400)))
+        date2 = date1 + pd.Timedelta(days=int(rng.integers(0, 120)))
+        setting = rng.choice(SETTINGS) if rng.random() < 0.6 else None
+        institutions = tuple(rng.choice(INSTITUTIONS + ["Nowhere"], int(rng.integers(0, 4)), replace=False))
+        yield date1, date2, setting, institutions
+
+
+def naive_lookup(df, date1, date2, setting, institutions):
+    mask = (df["Date Outbreak Began"] > date1) & (df["Date Outbreak Began"] <= date2)
+    if setting:
+        mask &= df["Outbreak Setting"] == setting
+    if institutions:
+        mask &= df["Institution Name"].isin(institutions)
+    return df[mask]
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_lookup_matches_boolean_masks(seed):
+    df = outbreaks(seed=seed)
+    index = OutbreakIndex(df)
+    for date1, date2, setting, institutions in random_filters(seed):
+        found = index.lookup(date1, date2, setting, institutions)
+        expected = naive_lookup(df, date1, date2, setting, institutions)
+        assert sorted(found["_id"]) == sorted(expected["_id"])
+        # Rows come back in date order.
+        assert found["Date Outbreak Began"].is_monotonic_increasing
+
+
+def naive_active(df, days, as_of):
+    # Per day, which outbreaks with a start date are active: started by then, and open or not yet over the day before.
+    known = df[df["Date Outbreak Began"].notna()]
+    began = known["Date Outbreak Began"]
+    last = np.maximum(known["Date Declared Over"].fillna(as_of), began)
+    return known, [(began <= day) & (last >= day) for day in days]
+
+
+@pytest.mark.parametrize("by", [None] + INTERVAL_GROUPS)
+def test_active_counts_match_per_day_counts(by):
+    df = outbreaks()
+    intervals = OutbreakIntervals(df)
+    as_of = max(df["Date Outbreak Began"].max(), df["Date Declared Over"].max())
+    for date1, date2, _, _ in random_filters(7, count=10):
+        days = day_range(date1, date2)
+        counts = intervals.active_counts(days, by=by)
+        known, active = naive_active(df, days, as_of)
+        groups = [None] if by is None else known[by].cat.categories
+        for group in groups:
+            in_group = True if group is None else known[by] == group
+            expected = np.array([(mask & in_group).sum() for mask in active], dtype=np.int64)
+            column = "All Outbreaks" if group is None else str(group)
+            if column in counts.columns:
+                np.testing.assert_array_equal(counts[column].to_numpy(), expected)
+            else:
+                # Groups with no active outbreak in the window are left out.
+                assert not expected.any()
+
+
+def test_durations_count_open_outbreaks():
+    df = outbreaks()
+    summary = OutbreakIntervals(df).durations().iloc[0]
+    known = df[df["Date Outbreak Began"].notna()]
+    assert summary["outbreaks"] == len(known)
+    assert summary["still_open"] == known["Date Declared Over"].isna().sum()
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from schemas import OUTBREAKS_SCHEMA, SchemaError, normalize
+
+BASE = {"name": "test", "dtype": {"Setting": "category", "Agent": "category"}, "ordered": {}, "dates": {},
+        "columns": ["Setting", "Agent"]}
+
+
+def frame(columns):
+    return pd.DataFrame({name: pd.Series(values, dtype="category") for name, values in columns.items()})
+
+
+CASES = [
+    ("rename",
+     {"rename": {"Facility": "Setting"}},
+     {"Facility": ["LTCH", "Hospital"], "Agent": ["COVID-19", "RSV"]},
+     {"Setting": ["LTCH", "Hospital"], "Agent": ["COVID-19", "RSV"]}),
+    ("byte-order mark",
+     {},
+     {"\ufeffSetting": ["LTCH"], "Agent": ["RSV"]},
+     {"Setting": ["LTCH"], "Agent": ["RSV"]}),
+    ("relabel",
+     {"relabel": {"Agent": {"Yes": "Hospitalized", "No": "Not Hospitalized"}}},
+     {"Setting": ["LTCH", "LTCH", "Hospital"], "Agent": ["Yes", "No", "Unknown"]},
+     {"Setting": ["LTCH", "LTCH", "Hospital"], "Agent": ["Hospitalized", "Not Hospitalized", "Unknown"]}),
+    ("relabel merging labels",
+     {"relabel": {"Agent": {"COVID": "COVID-19", "Covid-19": "COVID-19"}}},
+     {"Setting": ["LTCH", "LTCH", "Hospital"], "Agent": ["COVID", "Covid-19", "COVID-19"]},
+     {"Setting": ["LTCH", "LTCH", "Hospital"], "Agent": ["COVID-19", "COVID-19", "COVID-19"]}),
+    ("replace",
+     {"replace": {"Setting": {"LTCH": "Long-Term Care Home"}}},
+     {"Setting": ["LTCH", "LTCH - Unit 2", "Hospital"], "Agent": ["RSV", "RSV", "RSV"]},
+     {"Setting": ["Long-Term Care Home", "Long-Term Care Home - Unit 2", "Hospital"], "Agent": ["RSV", "RSV", "RSV"]}),
+    ("exclude",
+     {"exclude": {"Agent": ["Pending", "Not Listed"]}},
+     {"Setting": ["LTCH", "Hospital", "LTCH"], "Agent": ["RSV", "Pending", "COVID-19"]},
+     {"Setting": ["LTCH", "LTCH"], "Agent": ["RSV", "COVID-19"]}),
+]
+
+
+@pytest.mark.parametrize("rules, source, expected", [case[1:] for case in CASES], ids=[case[0] for case in CASES])
+def test_normalize_rules(rules, source, expected):
+    schema = dict(BASE, **rules)
+    result = normalize(frame(source), schema)
+    assert list(result.columns) == list(expected)
+    for column, values in expected.items():
+        assert result[column].tolist() == values
+        # Labels are rewritten in the categories themselves, and excluded labels are dropped from them.
+        categories = set(result[column].cat.categories)
+        if "exclude" in rules:
+            assert not categories & set(rules["exclude"].get(column, []))
+        else:
+            assert categories == set(values)
+    # Normalizing again changes nothing.
+    pd.testing.assert_frame_equal(normalize(result.copy(), schema), result)
+
+
+def test_missing_column_raises_schema_error():
+    with pytest.raises(SchemaError, match=r"test: missing columns \['Agent'\]"):
+        normalize(frame({"Setting": ["LTCH"], "Cause": ["RSV"]}), BASE)
+
+
+def test_missing_column_after_rename():
+    # A rename only helps when its source column is there.
+    schema = dict(BASE, rename={"Facility": "Setting"})
+    with pytest.raises(SchemaError, match="Setting"):
+        normalize(frame({"Site": ["LTCH"], "Agent": ["RSV"]}), schema)
+
+
+def test_outbreaks_schema_accepts_either_agent_spelling():
+    dump = pd.DataFrame({"_id": [1], "Institution Name": ["Home"], "Outbreak Setting": ["LTCH"],
+                         "Type of Outbreak": ["Respiratory"], "Causative Agent - 1": ["RSV"],
+                         "Causative Agent - 2": [None], "Date Outbreak Began": ["2023-01-02"],
+                         "Date Declared Over": [None], "Active": ["Y"]})
+    result = normalize(dump, OUTBREAKS_SCHEMA)
+    assert result["Causative Agent-1"].tolist() == ["RSV"]
+    assert result["Outbreak Setting"].tolist() == ["Long-Term Care Home"]
+    assert result["Date Outbreak Began"].dtype.kind == "M"